@@ -1,69 +1,179 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set, Tuple
+import asyncio
+from functools import lru_cache
+from types import MappingProxyType
 import re
-from thefuzz import fuzz
+import ahocorasick
+import numpy as np
+from rapidfuzz import fuzz, process
 
-IMPROVEMENT_KEYWORDS = {
-    "solar": [
+# Read-only: the shared automaton below is built from it once at import
+IMPROVEMENT_KEYWORDS = MappingProxyType({
+    "solar": (
         "solar", "photovoltaic", "pv", "pv panel",
         "solar panel", "solar pv", "photovoltaics"
-    ],
+    ),
 
-    "insulation": [
+    "insulation": (
         "insulation", "wall insulation", "external wall",
         "cavity wall", "loft insulation", "roof insulation"
-    ],
+    ),
 
-    "windows": [
+    "windows": (
         "window", "windows", "double glazing",
         "triple glazing", "glazing", "u-value",
         "energy efficient windows"
-    ],
+    ),
 
-    "heat_pump": [
+    "heat_pump": (
         "heat pump", "air source", "ground source",
         "ashp", "gshp",
         "air source heat pump",
         "ground source heat pump"
-    ],
+    ),
 
-    "battery": [
+    "battery": (
         "battery storage", "home battery",
         "powerwall", "battery unit",
         "energy storage system",
         "tesla battery"
-    ],
+    ),
 
-    "loft_conversion": [
+    "loft_conversion": (
         "loft conversion", "roof extension",
         "dormer", "mansard",
         "roof enlargement", "attic conversion"
-    ],
+    ),
 
-    "cladding": [
+    "cladding": (
         "external cladding", "render",
         "external wall finish",
         "facade upgrade", "wall rendering",
         "external insulation system"
-    ],
+    ),
 
-    "ev_charger": [
+    "ev_charger": (
         "electric vehicle charger",
         "ev charger",
         "charging point",
         "vehicle charging",
         "car charging point",
         "ev installation"
-    ]
-}
+    )
+})
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
 
 def normalize_text(text: str) -> str:
     """
     Lowercase and remove punctuation for consistent matching.
     """
-    text = text.lower()
-    text = re.sub(r"[^\w\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    text = _PUNCTUATION_RE.sub(" ", text.lower())
+    return " ".join(text.split())
+
+@lru_cache(maxsize=64)
+def get_keywords(improvement_type: str) -> Tuple[str, ...]:
+    """Normalized keyword list for an improvement type (computed once per type)."""
+    improvement_type = improvement_type.lower()
+    return tuple(normalize_text(k) for k in IMPROVEMENT_KEYWORDS.get(improvement_type, [improvement_type]))
+
+@lru_cache(maxsize=64)
+def get_keyword_automaton(improvement_type: str) -> ahocorasick.Automaton:
+    """Aho-Corasick automaton over an improvement type's keywords, for one-pass exact matching."""
+    automaton = ahocorasick.Automaton()
+    for keyword in get_keywords(improvement_type):
+        if keyword:
+            automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+def _build_shared_automaton() -> ahocorasick.Automaton:
+    """One automaton over every improvement keyword, each tagged with the types it belongs to."""
+    tags: Dict[str, set] = {}
+    for improvement_type, keywords in IMPROVEMENT_KEYWORDS.items():
+        for keyword in map(normalize_text, keywords):
+            if keyword:
+                tags.setdefault(keyword, set()).add(improvement_type)
+    automaton = ahocorasick.Automaton()
+    for keyword, types in tags.items():
+        automaton.add_word(keyword, frozenset(types))
+    automaton.make_automaton()
+    return automaton
+
+_AUTO = _build_shared_automaton()
+
+def match_improvement_types(text: str) -> Set[str]:
+    """Every improvement type with a keyword in text, from one scan of the shared automaton."""
+    matched = set()
+    for _, types in _AUTO.iter(normalize_text(text)):
+        matched |= types
+    return matched
+
+def has_keyword(automaton: ahocorasick.Automaton, text: str) -> bool:
+    """True if any keyword in the automaton occurs in text."""
+    if automaton.kind != ahocorasick.AHOCORASICK:
+        return False
+    return next(automaton.iter(text), None) is not None
+
+def normalize_applications(applications: List[Dict[str, Any]]) -> List[str]:
+    """
+    Normalize each application's proposal once, so classifying for several improvement
+    types reuses the same strings. The applications themselves are left untouched:
+    they are shared with the IBex results cache and may be read from worker threads.
+    """
+    return [normalize_text(app.get("proposal") or "") for app in applications]
+
+def classify_applications(
+    applications: List[Dict[str, Any]],
+    improvement_types: Optional[List[str]] = None,
+    use_fuzzy: bool = True,
+    fuzzy_threshold: int = 85
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Bucket planning applications by improvement type in one pass.
+    Each proposal is scanned once against the shared keyword automaton; only
+    proposals a type missed go on to that type's fuzzy scoring.
+    Types without a keyword list fall back to matching their own name.
+    """
+    if improvement_types is None:
+        improvement_types = list(IMPROVEMENT_KEYWORDS)
+    rows = {t: i for i, t in enumerate(dict.fromkeys(t.lower() for t in improvement_types))}
+    proposals = normalize_applications(applications)
+    matched = np.zeros((len(rows), len(proposals)), dtype=bool)
+
+    # Exact pass: a single scan per proposal yields every known type it mentions
+    known = [t for t in rows if t in IMPROVEMENT_KEYWORDS]
+    if known:
+        for j, proposal in enumerate(proposals):
+            for _, types in _AUTO.iter(proposal):
+                for t in types:
+                    row = rows.get(t)
+                    if row is not None:
+                        matched[row, j] = True
+    for t, row in rows.items():
+        if t not in IMPROVEMENT_KEYWORDS:
+            automaton = get_keyword_automaton(t)
+            matched[row] = np.fromiter((has_keyword(automaton, p) for p in proposals), dtype=bool, count=len(proposals))
+
+    if use_fuzzy:
+        for t, row in rows.items():
+            residual = np.flatnonzero(~matched[row])
+            if not residual.size:
+                continue
+            # One native (keywords x proposals) score matrix. uint8 scores are rounded like
+            # thefuzz's were, so the cutoff lets through anything that rounds up to the threshold.
+            scores = process.cdist(
+                get_keywords(t),
+                [proposals[i] for i in residual],
+                scorer=fuzz.partial_ratio,
+                score_cutoff=fuzzy_threshold - 0.5,
+                dtype=np.uint8,
+                workers=-1
+            )
+            matched[row, residual[scores.max(axis=0) >= fuzzy_threshold]] = True
+
+    buckets = {t: [applications[i] for i in np.flatnonzero(matched[row])] for t, row in rows.items()}
+    return {t: buckets[t.lower()] for t in improvement_types}
 
 def filter_by_improvement_type(
     applications: List[Dict[str, Any]], 
@@ -76,26 +186,18 @@ def filter_by_improvement_type(
     1. Normalized keyword matching
     2. Optional fuzzy string matching for typos/variations
     """
-    keywords = [normalize_text(k) for k in IMPROVEMENT_KEYWORDS.get(improvement_type.lower(), [improvement_type.lower()])]
-    matching = []
-
-    for app in applications:
-        proposal = normalize_text(app.get("proposal", ""))
-        found = False
-
-        for keyword in keywords:
-            if keyword in proposal:
-                matching.append(app)
-                found = True
-                break
-        if found:
-            continue
-
-        if use_fuzzy:
-            for keyword in keywords:
-                score = fuzz.partial_ratio(keyword, proposal)
-                if score >= fuzzy_threshold:
-                    matching.append(app)
-                    break
-
-    return matching
\ No newline at end of file
+    return classify_applications(applications, [improvement_type], use_fuzzy, fuzzy_threshold)[improvement_type]
+
+async def classify_applications_async(
+    applications: List[Dict[str, Any]],
+    improvement_types: Optional[List[str]] = None,
+    use_fuzzy: bool = True,
+    fuzzy_threshold: int = 85
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Run classify_applications on a worker thread so the fuzzy scoring
+    (which releases the GIL inside RapidFuzz) doesn't block the event loop.
+    """
+    return await asyncio.to_thread(
+        classify_applications, applications, improvement_types, use_fuzzy, fuzzy_threshold
+    )
@@ -0,0 +1,204 @@
+import asyncio
+import functools
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Sentinel for caching "upstream had no result", kept only briefly so new data shows up soon
+MISS = object()
+MISS_TTL = 600.0
+
+
+class TTLCache:
+    """
+    Small in-process LRU cache whose entries expire after `ttl` seconds.
+    Giving it a `name` lets attach_store() mirror it to SQLite so it survives restarts;
+    persisted caches need string keys and JSON-serialisable values.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0, name: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        if name:
+            _named_caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self._set_local(key, value, ttl)
+        # Misses are short-lived, so only real results are worth writing to disk
+        if _store is not None and self.name and value is not MISS:
+            _store.put(self.name, key, value, time.time() + ttl)
+
+    def _set_local(self, key: Hashable, value: Any, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteStore:
+    """
+    One SQLite file backing every named TTLCache, with expiry stored as wall-clock time.
+    Writes are queued to a background thread so cache.set never waits on disk I/O.
+    """
+
+    _INSERT = "INSERT OR REPLACE INTO cache_entries (cache, key, value, expires_at) VALUES (?, ?, ?, ?)"
+    _STOP = object()
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "cache TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (cache, key))"
+        )
+        self._writes: "queue.Queue[Any]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="cache-store-writer", daemon=True)
+        self._writer.start()
+
+    def load(self, cache: TTLCache) -> int:
+        now = time.time()
+        self._conn.execute("DELETE FROM cache_entries WHERE cache = ? AND expires_at <= ?", (cache.name, now))
+        rows = self._conn.execute(
+            "SELECT key, value, expires_at FROM cache_entries WHERE cache = ? ORDER BY expires_at",
+            (cache.name,)
+        ).fetchall()
+        for key, value, expires_at in rows:
+            cache._set_local(key, orjson.loads(value), expires_at - now)
+        return len(rows)
+
+    def put(self, cache_name: str, key: Hashable, value: Any, expires_at: float) -> None:
+        # Serialise here so unencodable values are reported by the caller's cache
+        try:
+            row = (cache_name, key, orjson.dumps(value), expires_at)
+        except TypeError as e:
+            logger.warning("Could not persist %s cache entry: %s", cache_name, e)
+            return
+        self._writes.put(row)
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._writes.get()]
+            # Write everything that queued up meanwhile in one go
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not self._STOP]
+            if rows:
+                try:
+                    self._conn.executemany(self._INSERT, rows)
+                except sqlite3.Error as e:
+                    logger.warning("Could not persist %d cache entries: %s", len(rows), e)
+            for _ in batch:
+                self._writes.task_done()
+            if len(rows) < len(batch):
+                return
+
+    def flush(self) -> None:
+        """Block until every queued write has reached the database."""
+        self._writes.join()
+
+    def close(self) -> None:
+        self._writes.put(self._STOP)
+        self._writer.join()
+        self._conn.close()
+
+
+_named_caches: Dict[str, TTLCache] = {}
+_store: Optional[SQLiteStore] = None
+
+def attach_store(path: str) -> None:
+    """Open the SQLite cache file and warm every named cache from it."""
+    global _store
+    try:
+        store = SQLiteStore(path)
+    except sqlite3.Error as e:
+        logger.warning("Persistent cache disabled, could not open %s: %s", path, e)
+        return
+    try:
+        for name, cache in _named_caches.items():
+            logger.info("Loaded %d %s cache entries from %s", store.load(cache), name, path)
+    except sqlite3.Error as e:
+        logger.warning("Persistent cache disabled, could not read %s: %s", path, e)
+        store.close()
+        return
+    _store = store
+
+def detach_store() -> None:
+    """Write out pending entries and close the SQLite cache file."""
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
+
+
+def single_flight(key_fn: Callable[..., Hashable]):
+    """
+    Coalesce concurrent calls of an async function that share key_fn(*args, **kwargs):
+    the first call runs, later callers await the same result until it finishes.
+    The shared call keeps running while anyone is waiting on it; once the last caller
+    is cancelled it is cancelled too, so abandoned requests don't keep using upstream quota.
+    """
+    def decorator(fn: Callable[..., Awaitable[Any]]):
+        # key -> [shared future, number of callers waiting on it]
+        inflight: Dict[Hashable, list] = {}
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = key_fn(*args, **kwargs)
+            entry = inflight.get(key)
+            if entry is None:
+                entry = inflight[key] = [asyncio.ensure_future(fn(*args, **kwargs)), 0]
+
+                def forget(_, entry=entry):
+                    if inflight.get(key) is entry:
+                        del inflight[key]
+                entry[0].add_done_callback(forget)
+
+            future = entry[0]
+            entry[1] += 1
+            try:
+                # Shielded so one caller being cancelled doesn't cancel the fetch for the others
+                return await asyncio.shield(future)
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0 and not future.done():
+                    # Every caller has gone; new callers start a fresh call rather than join this one
+                    if inflight.get(key) is entry:
+                        del inflight[key]
+                    future.cancel()
+        return wrapper
+    return decorator
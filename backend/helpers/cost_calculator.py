@@ -8,6 +8,7 @@ M2_RATES = {
     "solar": 85.0,       
     "heat_pump": 150.0   
 }
+DEFAULT_M2_RATE = 100.0
 
 def calculate_cost(
     improvement_type: str,
@@ -18,7 +19,7 @@ def calculate_cost(
     area = property_metrics.get("floor_area", 90.0)
     imp_key = improvement_type.lower()
     
-    base_rate = M2_RATES.get(imp_key, 100.0)
+    base_rate = M2_RATES.get(imp_key, DEFAULT_M2_RATE)
     cost = area * base_rate
     
     if imp_key == "heat_pump":
@@ -1,11 +1,50 @@
 import httpx
+import orjson
 import os
 import re
 import base64
-from typing import Dict, Any
+import logging
+from typing import Dict, Any, List, Optional
+from helpers.cache import TTLCache
 
 EPC_BAND_TO_NUMERIC = {"A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7}
-NUMERIC_TO_EPC_BAND = {v: k for k, v in EPC_BAND_TO_NUMERIC.items()}
+# Indexed by band number (1-7); position 0 is unused
+NUMERIC_TO_EPC_BAND = "_ABCDEFG"
+
+def epc_band_to_numeric(band: str, default: int = 4) -> int:
+    """Band letter to 1 (A) .. 7 (G) by character code, or default for anything else."""
+    if len(band) == 1:
+        index = ord(band.upper()) - 64
+        if 1 <= index <= 7:
+            return index
+    return default
+
+logger = logging.getLogger(__name__)
+
+# Only these columns are read from a certificate row; the rest are dropped before caching
+_EPC_FIELDS = (
+    "address1", "address", "total-floor-area", "current-energy-rating",
+    "property-type", "built-form", "co2-emissions-current",
+    "co2-emissions-potential", "energy-consumption-current"
+)
+
+_HOUSE_NUM_RE = re.compile(r'\b(\d+[A-Za-z]?)\b')
+_LEADING_NUM_RE = re.compile(r'(\d+[A-Za-z]?)\b')
+
+def index_rows_by_house_number(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Map each house number to the first EPC row whose address1 starts with it
+    or whose full address contains it as a word, so lookups are a single dict hit.
+    """
+    by_num = {}
+    for row in rows:
+        match = _LEADING_NUM_RE.match(row.get("address1", "").upper())
+        if match:
+            by_num.setdefault(match.group(1), row)
+        for token in row.get("address", "").upper().split():
+            if token[0].isdigit():
+                by_num.setdefault(token, row)
+    return by_num
 
 class EPCClient:
     def __init__(self):
@@ -23,6 +62,8 @@ class EPCClient:
             "cladding": -1,
             "loft_conversion": -0.5
         }
+        # Same scores in tenths of a band, so combined plans sum exactly as integers
+        self.improvement_scores_int = {k: round(v * 10) for k, v in self.improvement_scores.items()}
 
         # Use proper Basic Auth encoding: email:api_key
         if self.email and self.api_key:
@@ -35,62 +76,99 @@ class EPCClient:
         else:
             raise ValueError("EPC_EMAIL and EPC_API_KEY must be set in environment variables")
 
+        # One pooled HTTP/2 client for the lifetime of the app instead of a handshake per lookup
+        self._http: Optional[httpx.AsyncClient] = None
+
+        # EPC certificates change slowly: keep raw rows per postcode and resolved metrics per property for a day.
+        # Resolved metrics are small and persisted with the other upstream caches
+        self._rows_cache = TTLCache(maxsize=5_000, ttl=86400)
+        self._metrics_cache = TTLCache(maxsize=20_000, ttl=86400, name="epc_metrics")
+
+    def _new_http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            headers=self.headers,
+            timeout=10.0,
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # Built on first use, and again after aclose(), like IBexClient.http
+        if self._http is None:
+            self._http = self._new_http_client()
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
     async def get_property_metrics(self, address: str, postcode: str) -> Dict[str, Any]:
         """
         Fetch floor area, EPC band, property type, built form, and optionally CO₂ / energy data.
         Fallbacks are used if API fails or no match is found.
         """
         house_num = None
-        match = re.search(r'\b(\d+[A-Za-z]?)\b', address)
+        match = _HOUSE_NUM_RE.search(address)
         if match:
             house_num = match.group(1).upper()
 
+        postcode_key = "".join(postcode.upper().split())
+        metrics_key = f"{postcode_key}:{house_num or ''}"
+        cached = self._metrics_cache.get(metrics_key)
+        if cached is not None:
+            return cached
+
         params = {"postcode": postcode, "size": 100}
 
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(self.base_url, headers=self.headers, params=params)
+            cached_rows = self._rows_cache.get(postcode_key)
+            if cached_rows is None:
+                response = await self.http.get(self.base_url, params=params)
                 if response.status_code != 200:
                     raise Exception(f"HTTP {response.status_code}")
 
-                rows = response.json().get("rows", [])
+                rows = [
+                    {field: row[field] for field in _EPC_FIELDS if field in row}
+                    for row in orjson.loads(response.content).get("rows", [])
+                ]
                 if not rows:
                     raise Exception("No EPC rows returned")
+                cached_rows = (rows, index_rows_by_house_number(rows))
+                self._rows_cache.set(postcode_key, cached_rows)
+
+            rows, by_num = cached_rows
 
-                # Step 1: exact house number match
-                best_match = None
-                if house_num:
-                    for row in rows:
-                        addr1 = row.get("address1", "").upper()
-                        addr_full = row.get("address", "").upper()
-                        if addr1.startswith(house_num) or f" {house_num} " in f" {addr_full} ":
-                            best_match = row
-                            break
-
-                # Step 2: fallback to first row with valid energy rating
-                if not best_match:
-                    for row in rows:
-                        rating = row.get("current-energy-rating")
-                        if rating:
-                            best_match = row
-                            break
-
-                # Step 3: final fallback
-                if not best_match:
-                    best_match = rows[0]
-
-                return {
-                    "floor_area": float(best_match.get("total-floor-area", 90)),
-                    "current_energy_rating": best_match.get("current-energy-rating", "D").upper(),
-                    "property_type": best_match.get("property-type", "House"),
-                    "built_form": best_match.get("built-form", "Semi-Detached"),
-                    "co2_emissions_current": float(best_match.get("co2-emissions-current", 0)),
-                    "co2_emissions_potential": float(best_match.get("co2-emissions-potential", 0)),
-                    "energy_consumption_current": float(best_match.get("energy-consumption-current", 0))
-                }
+            # Step 1: exact house number match
+            best_match = by_num.get(house_num) if house_num else None
+
+            # Step 2: fallback to first row with valid energy rating
+            if not best_match:
+                for row in rows:
+                    rating = row.get("current-energy-rating")
+                    if rating:
+                        best_match = row
+                        break
+
+            # Step 3: final fallback
+            if not best_match:
+                best_match = rows[0]
+
+            metrics = {
+                "floor_area": float(best_match.get("total-floor-area", 90)),
+                "current_energy_rating": best_match.get("current-energy-rating", "D").upper(),
+                "property_type": best_match.get("property-type", "House"),
+                "built_form": best_match.get("built-form", "Semi-Detached"),
+                "co2_emissions_current": float(best_match.get("co2-emissions-current", 0)),
+                "co2_emissions_potential": float(best_match.get("co2-emissions-potential", 0)),
+                "energy_consumption_current": float(best_match.get("energy-consumption-current", 0))
+            }
+            self._metrics_cache.set(metrics_key, metrics)
+            return metrics
 
         except Exception as e:
-            print(f"[EPC API] Error: {e}")
+            logger.warning("[EPC API] Error: %s", e)
 
         # Default fallback if anything goes wrong
         return {
@@ -110,8 +188,7 @@ class EPCClient:
         Estimate EPC band cumulatively for multiple improvements.
         Each improvement adds its effect rather than just taking the best.
         """
-        numeric = EPC_BAND_TO_NUMERIC.get(current_band.upper(), 4)  # default D
-        for imp in improvements:
-            numeric += self.improvement_scores.get(imp, 0)
-        numeric = max(1, min(7, round(numeric)))
-        return NUMERIC_TO_EPC_BAND[numeric]
\ No newline at end of file
+        numeric = epc_band_to_numeric(current_band)  # default D
+        delta = sum(self.improvement_scores_int.get(imp, 0) for imp in improvements)
+        numeric = max(1, min(7, round(numeric + delta / 10)))
+        return NUMERIC_TO_EPC_BAND[numeric]
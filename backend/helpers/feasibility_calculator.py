@@ -1,4 +1,35 @@
 import httpx
+import logging
+import orjson
+from typing import Optional
+from helpers.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Conservation-area boundaries change rarely; remember answers per ~1m grid cell for a week
+_conservation_cache = TTLCache(maxsize=50_000, ttl=7 * 86400)
+
+PLANNING_DATA_URL = "https://www.planning.data.gov.uk/entity.json"
+
+# One pooled client for every conservation-area lookup, so the TLS connection is reused
+_client: Optional[httpx.AsyncClient] = None
+
+def _http() -> httpx.AsyncClient:
+    # Like geocoding._http: rebuilt lazily after aclose()
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=5.0,
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+    return _client
+
+async def aclose() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
 async def check_conservation_area(latitude: float, longitude: float) -> bool:
     """
@@ -7,8 +38,12 @@ async def check_conservation_area(latitude: float, longitude: float) -> bool:
     """
     if latitude is None or longitude is None:
         return False
-        
-    url = "https://www.planning.data.gov.uk/entity.json"
+
+    key = (round(latitude, 5), round(longitude, 5))
+    cached = _conservation_cache.get(key)
+    if cached is not None:
+        return cached
+
     params = {
         "dataset": "conservation-area",
         "longitude": str(longitude),
@@ -17,32 +52,19 @@ async def check_conservation_area(latitude: float, longitude: float) -> bool:
     }
     
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                entities = data.get("entities", [])
-                if entities:
-                    return True
+        response = await _http().get(PLANNING_DATA_URL, params=params)
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            in_area = bool(data.get("entities", []))
+            _conservation_cache.set(key, in_area)
+            return in_area
     except Exception as e:
-        print(f"[Conservation API] Error checking conservation area: {e}")
+        logger.warning("[Conservation API] Error checking conservation area: %s", e)
         
     return False
 
-async def calculate_feasibility(
-    improvement_type: str, 
-    approved_count: int,
-    latitude: float = None,
-    longitude: float = None
-) -> str:
-    """
-    Calculate feasibility rating based on number of approved examples,
-    and cross-reference with Conservation Area restrictions.
-    """
-    in_conservation_area = False
-    if latitude is not None and longitude is not None:
-        in_conservation_area = await check_conservation_area(latitude, longitude)
-    
+def feasibility_rating(improvement_type: str, approved_count: int, in_conservation_area: bool) -> str:
+    """Feasibility rating for an improvement once the Conservation Area status is known (no I/O)."""
     # Overrides for Conservation Areas
     if in_conservation_area:
         if improvement_type.lower() == "solar":
@@ -56,4 +78,22 @@ async def calculate_feasibility(
     elif approved_count >= 1:
         return "MEDIUM"
     else:
-        return "LOW"
\ No newline at end of file
+        return "LOW"
+
+async def calculate_feasibility(
+    improvement_type: str, 
+    approved_count: int,
+    latitude: float = None,
+    longitude: float = None,
+    in_conservation_area: Optional[bool] = None
+) -> str:
+    """
+    Calculate feasibility rating based on number of approved examples,
+    and cross-reference with Conservation Area restrictions.
+    Callers that already know the Conservation Area status should use feasibility_rating.
+    """
+    if in_conservation_area is None:
+        in_conservation_area = False
+        if latitude is not None and longitude is not None:
+            in_conservation_area = await check_conservation_area(latitude, longitude)
+    return feasibility_rating(improvement_type, approved_count, in_conservation_area)
@@ -0,0 +1,87 @@
+import asyncio
+import httpx
+import orjson
+import time
+from typing import Optional, Dict, Any
+from helpers.cache import TTLCache, MISS, MISS_TTL
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+# Nominatim's usage policy allows at most one request per second per application
+NOMINATIM_MIN_INTERVAL = 1.0
+
+# One pooled HTTP/2 client for every geocode call so the TLS connection to Nominatim is reused.
+# It is created on first use rather than at import, and again after aclose(), so the app's
+# lifespan can close it and a later startup in the same process still works
+_client: Optional[httpx.AsyncClient] = None
+
+def _http() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=10.0,
+            headers={"User-Agent": "ProptechAnalysisApp/1.0"},
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+    return _client
+
+# Address -> coordinates practically never changes; keep results for 30 days
+_geocode_cache = TTLCache(maxsize=10_000, ttl=30 * 86400, name="geocode")
+
+# Spaces out request starts across every concurrent caller (e.g. a fanned-out batch)
+_rate_lock = asyncio.Lock()
+_last_request_at = 0.0
+
+async def aclose() -> None:
+    global _client, _rate_lock
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    # The lock binds to the loop it is first contended on; a restarted app gets a new loop
+    _rate_lock = asyncio.Lock()
+
+async def _wait_for_rate_limit() -> None:
+    """Sleep until at least NOMINATIM_MIN_INTERVAL has passed since the previous request started."""
+    global _last_request_at
+    async with _rate_lock:
+        delay = _last_request_at + NOMINATIM_MIN_INTERVAL - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        _last_request_at = time.monotonic()
+
+def normalize_query(address_query: str) -> str:
+    """Uppercase and collapse whitespace so equivalent queries share a cache entry."""
+    return " ".join(address_query.upper().split())
+
+async def geocode_address(address_query: str) -> Optional[Dict[str, Any]]:
+    """Resolve an address to latitude, longitude and display name via Nominatim."""
+    key = normalize_query(address_query)
+    cached = _geocode_cache.get(key)
+    if cached is MISS:
+        return None
+    if cached is not None:
+        return cached
+
+    await _wait_for_rate_limit()
+    # Another caller may have resolved the same address while this one waited its turn
+    cached = _geocode_cache.get(key)
+    if cached is MISS:
+        return None
+    if cached is not None:
+        return cached
+
+    params = {"q": address_query, "format": "json", "limit": 1, "countrycodes": "gb"}
+    response = await _http().get(NOMINATIM_URL, params=params)
+    geo_data = orjson.loads(response.content)
+
+    if not geo_data:
+        _geocode_cache.set(key, MISS, ttl=MISS_TTL)
+        return None
+
+    result = {
+        "latitude": float(geo_data[0]["lat"]),
+        "longitude": float(geo_data[0]["lon"]),
+        "display_name": geo_data[0]["display_name"]
+    }
+    _geocode_cache.set(key, result)
+    return result
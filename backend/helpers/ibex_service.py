@@ -1,6 +1,34 @@
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from datetime import date, timedelta
+from functools import lru_cache
+import logging
+from typing import List, Dict, Any, Tuple
 from ibex_client import IBexClient
+from helpers.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+# The analysis reads only core application fields plus centre_point (for example map pins).
+# Asking for just that extension keeps document metadata, unit mixes, appeals etc. out of
+# the payload, so far less JSON is transferred, parsed and held per request.
+_EXTENSIONS = {"centre_point": True}
+
+# The only application fields the analysis reads (matching, timelines and examples);
+# everything else is dropped as soon as the search returns
+_APPLICATION_FIELDS = (
+    "planning_reference", "proposal", "normalised_decision", "application_date",
+    "decided_date", "centre_point", "current_energy_rating"
+)
+
+# Approved applications around a point change at most daily; repeat analyses of the
+# same spot within the hour reuse the search. Kept in memory only (payloads are large)
+_applications_cache = TTLCache(maxsize=2_000, ttl=3600)
+
+@lru_cache(maxsize=8)
+def _date_window(today_ordinal: int, years_back: int) -> Tuple[str, str]:
+    """(date_from, date_to) ISO strings for a search ending today; computed once per day."""
+    today = date.fromordinal(today_ordinal)
+    return (today - timedelta(days=years_back * 365)).isoformat(), today.isoformat()
 
 
 async def fetch_planning_applications(
@@ -12,10 +40,16 @@ async def fetch_planning_applications(
 ) -> List[Dict[str, Any]]:
     """Fetch approved planning applications from IBex API"""
     
-    date_to = datetime.now().date().isoformat()
-    date_from = (datetime.now().date() - timedelta(days=years_back * 365)).isoformat()
+    date_from, date_to = _date_window(date.today().toordinal(), years_back)
+
+    # ~1m precision: clicks on the same property share one cache entry
+    latitude, longitude = round(latitude, 5), round(longitude, 5)
+    cache_key = f"{latitude},{longitude}:{radius}:{date_from}:{date_to}"
+    cached = _applications_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    print(f"🔍 Searching for retrofit examples in {radius}m radius...")
+    logger.info("Searching for retrofit examples in %dm radius", radius)
     
     applications = await ibex_client.search_by_location(
         latitude=latitude,
@@ -26,12 +60,16 @@ async def fetch_planning_applications(
         filters={
             "normalised_decision": ["Approved"],
             "normalised_application_type": ["full planning application", "householder planning application"]
-        }
+        },
+        extensions=_EXTENSIONS
     )
     
-    if not isinstance(applications, list):
+    if isinstance(applications, list):
+        applications = [{f: app[f] for f in _APPLICATION_FIELDS if f in app} for app in applications]
+    else:
         applications = []
     
-    print(f"Found {len(applications)} approved applications\n")
+    logger.info("Found %d approved applications", len(applications))
+    _applications_cache.set(cache_key, applications)
     
     return applications
@@ -23,11 +23,16 @@ SYSTEM_LIFESPAN = {
     "ev_charger": 10,
 }
 
+DEFAULT_ANNUAL_SAVINGS = 200.0
+
+# Flattened per-type lookups, so the per-request functions don't allocate fallback dicts
+_ENVIRONMENTAL_IMPACT = {k: (b["co2_kg"], b["kwh"]) for k, b in ANNUAL_IMPACT_BENCHMARKS.items()}
+_NO_ENVIRONMENTAL_IMPACT = (0.0, 0.0)
+_ANNUAL_SAVINGS = {k: b["money"] for k, b in ANNUAL_IMPACT_BENCHMARKS.items()}
+
 def get_environmental_impact(improvement_type: str) -> Tuple[float, float]:
     """Returns estimated annual CO2 savings (kg) and Energy savings (kWh)."""
-    imp_key = improvement_type.lower()
-    impact = ANNUAL_IMPACT_BENCHMARKS.get(imp_key, {"co2_kg": 0.0, "kwh": 0.0})
-    return impact["co2_kg"], impact["kwh"]
+    return _ENVIRONMENTAL_IMPACT.get(improvement_type.lower(), _NO_ENVIRONMENTAL_IMPACT)
 
 def calculate_roi_proper(
     improvement_type: str,
@@ -36,7 +41,7 @@ def calculate_roi_proper(
     analysis_period_years: int = 10
 ) -> Dict[str, Any]:
     imp_key = improvement_type.lower()
-    annual_savings = ANNUAL_IMPACT_BENCHMARKS.get(imp_key, {"money": 200.0})["money"]
+    annual_savings = _ANNUAL_SAVINGS.get(imp_key, DEFAULT_ANNUAL_SAVINGS)
     
     total_savings = annual_savings * analysis_period_years
     total_maintenance = (estimated_cost * 0.01) * analysis_period_years
@@ -17,18 +17,20 @@ def generate_summary(
     - Add regulatory compliance notes
     - Suggest next steps
     """
-    summary = f"Analysis for {num_improvements} improvements at {postcode}. "
-    summary += f"Total estimated cost: £{total_cost:,.2f}. "
-    summary += f"Projected value increase: £{total_value_increase:,.2f} ({total_roi:.1f}% ROI). "
+    parts = [
+        f"Analysis for {num_improvements} improvements at {postcode}. ",
+        f"Total estimated cost: £{total_cost:,.2f}. ",
+        f"Projected value increase: £{total_value_increase:,.2f} ({total_roi:.1f}% ROI). ",
+    ]
     
     if within_budget:
         remaining = budget - total_cost
-        summary += f"All improvements fit within budget of £{budget:,.2f} (£{remaining:,.2f} remaining). "
+        parts.append(f"All improvements fit within budget of £{budget:,.2f} (£{remaining:,.2f} remaining). ")
     else:
         excess = total_cost - budget
-        summary += f"Total cost exceeds budget by £{excess:,.2f}. "
+        parts.append(f"Total cost exceeds budget by £{excess:,.2f}. ")
     
     if high_feasibility_count > 0:
-        summary += f"{high_feasibility_count} improvement(s) have high feasibility based on local approvals."
+        parts.append(f"{high_feasibility_count} improvement(s) have high feasibility based on local approvals.")
     
-    return summary
+    return "".join(parts)
\ No newline at end of file
@@ -1,61 +1,78 @@
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from models import RetrofitExample
 import re
 
-def calculate_average_approval_time(applications: List[Dict[str, Any]]) -> Optional[float]:
-    """Calculate average time from application to decision in days"""
-    decision_times = []
-    
-    for app in applications:
-        if app.get("application_date") and app.get("decided_date"):
-            try:
-                app_date = datetime.fromisoformat(app["application_date"].replace('Z', '+00:00'))
-                dec_date = datetime.fromisoformat(app["decided_date"].replace('Z', '+00:00'))
-                days = (dec_date - app_date).days
-                decision_times.append(days)
-            except:
-                pass
-    
-    return sum(decision_times) / len(decision_times) if decision_times else None
-
-
-def extract_examples(applications: List[Dict[str, Any]], property_metrics: Dict[str, Any], limit: int = 5) -> List[RetrofitExample]:
+_POINT_RE = re.compile(r"POINT\(([-\d.]+)\s+([-\d.]+)\)")
+
+_ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+@lru_cache(maxsize=8192)
+def _parse_iso(value: str) -> datetime:
+    # Many applications share dates and each one is scanned once per improvement type,
+    # so each distinct date string is parsed only once
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def decision_time_days(app: Dict[str, Any]) -> Optional[int]:
+    """Days from application to decision, or None if either date is missing or unparseable"""
+    app_str = app.get("application_date")
+    dec_str = app.get("decided_date")
+    # Cheap shape check first so malformed rows skip the exception path entirely
+    if not (isinstance(app_str, str) and isinstance(dec_str, str)
+            and _ISO_DATE_RE.match(app_str) and _ISO_DATE_RE.match(dec_str)):
+        return None
+    try:
+        return (_parse_iso(dec_str) - _parse_iso(app_str)).days
+    except (ValueError, TypeError):
+        # Out-of-range dates, or one date with a timezone and one without
+        return None
+
+
+def build_example(app: Dict[str, Any], decision_time: Optional[int], current_epc: str) -> RetrofitExample:
+    """Build a RetrofitExample from a planning application"""
+    # 🔥 Extract coordinates from centre_point
+    latitude = None
+    longitude = None
+
+    centre = app.get("centre_point")
+    if centre:
+        match = _POINT_RE.search(centre)
+        if match:
+            longitude = float(match.group(1))
+            latitude = float(match.group(2))
+
+    return RetrofitExample(
+        planning_reference=app.get("planning_reference", "N/A"),
+        proposal=app.get("proposal", "N/A"),
+        decision=app.get("normalised_decision", "N/A"),
+        decision_time_days=decision_time,
+        application_date=app.get("application_date", "N/A"),
+        decided_date=app.get("decided_date"),
+        latitude=latitude,
+        longitude=longitude,
+        current_energy_rating=app.get("current_energy_rating", current_epc)
+    )
+
+
+def summarize_applications(
+    applications: List[Dict[str, Any]],
+    property_metrics: Dict[str, Any],
+    limit: int = 5
+) -> Tuple[Optional[float], List[RetrofitExample]]:
+    """Average approval time and the first `limit` examples in one pass, parsing each row's dates once"""
+    total = 0
+    count = 0
     examples = []
     current_epc = property_metrics.get("current_energy_rating", "D")
 
-    for app in applications[:limit]:
-        decision_time = None
-
-        if app.get("application_date") and app.get("decided_date"):
-            try:
-                app_date = datetime.fromisoformat(app["application_date"].replace('Z', '+00:00'))
-                dec_date = datetime.fromisoformat(app["decided_date"].replace('Z', '+00:00'))
-                decision_time = (dec_date - app_date).days
-            except:
-                pass
-
-        # 🔥 Extract coordinates from centre_point
-        latitude = None
-        longitude = None
-
-        centre = app.get("centre_point")
-        if centre:
-            match = re.search(r"POINT\(([-\d\.]+)\s+([-\d\.]+)\)", centre)
-            if match:
-                longitude = float(match.group(1))
-                latitude = float(match.group(2))
-
-        examples.append(RetrofitExample(
-            planning_reference=app.get("planning_reference", "N/A"),
-            proposal=app.get("proposal", "N/A"),
-            decision=app.get("normalised_decision", "N/A"),
-            decision_time_days=decision_time,
-            application_date=app.get("application_date", "N/A"),
-            decided_date=app.get("decided_date"),
-            latitude=latitude,
-            longitude=longitude,
-            current_energy_rating=app.get("current_energy_rating", current_epc)
-        ))
-
-    return examples
+    for i, app in enumerate(applications):
+        days = decision_time_days(app)
+        if days is not None:
+            total += days
+            count += 1
+        if i < limit:
+            examples.append(build_example(app, days, current_epc))
+
+    avg_time = total / count if count else None
+    return avg_time, examples
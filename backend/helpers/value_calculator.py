@@ -1,60 +1,188 @@
+import asyncio
 import httpx
+import orjson
 import os
+import random
 import re
 import base64
+import logging
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
 from typing import Optional, Tuple, List, Dict, Any
+from helpers.cache import TTLCache, MISS, MISS_TTL, single_flight
+from helpers.application_filter import match_improvement_types
+from helpers.epcClient import index_rows_by_house_number
+
+logger = logging.getLogger(__name__)
 
 EPC_PREMIUMS = {'A': 0.14, 'B': 0.10, 'C': 0.05, 'D': 0.00, 'E': -0.05, 'F': -0.08, 'G': -0.12}
 EXPECTED_EPC_JUMP = {"solar": 1, "insulation": 2, "windows": 1, "heat_pump": 2,
                      "battery": 1, "loft_conversion": 1, "cladding": 1, "ev_charger": 1}
 EPC_BANDS = ['G', 'F', 'E', 'D', 'C', 'B', 'A']
+NATIONAL_AVERAGE_PRICE = 285000.0 # UK national average, used when no local price is found
+# O(1) band -> position in EPC_BANDS, and premiums laid out in the same order
+EPC_BAND_INDEX = {band: i for i, band in enumerate(EPC_BANDS)}
+EPC_PREMIUMS_ARR = tuple(EPC_PREMIUMS[band] for band in EPC_BANDS)
+# Premium gained moving between any two bands: EPC_PREMIUM_DELTA[current_index][new_index]
+EPC_PREMIUM_DELTA = tuple(tuple(new - current for new in EPC_PREMIUMS_ARR) for current in EPC_PREMIUMS_ARR)
 
-async def fetch_district_average_price(postcode: str) -> Optional[float]:
-    """Queries HM Land Registry for the average price in the postcode district (e.g., N11)."""
-    clean_postcode = postcode.strip().upper()
-    if " " not in clean_postcode and len(clean_postcode) > 3:
-        clean_postcode = f"{clean_postcode[:-3]} {clean_postcode[-3:]}"
-        
-    outward_code = clean_postcode.split(" ")[0]
+_HOUSE_NUM_RE = re.compile(r'\b(\d+[A-Za-z]?)\b')
+
+# Shared across Land Registry and EPC calls so connections are kept alive between requests;
+# sized so concurrent analyses can each hold a connection to both hosts
+# Fail fast: a stalled upstream should cost a request seconds, not the whole analysis
+_TIMEOUT = httpx.Timeout(connect=2.0, read=5.0, write=5.0, pool=1.0)
+_client: Optional[httpx.AsyncClient] = None
+
+def _http() -> httpx.AsyncClient:
+    # Lazily (re)built, so a restarted lifespan gets a fresh client
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=_TIMEOUT,
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        )
+    return _client
+
+LAND_REGISTRY_SPARQL_URL = "http://landregistry.data.gov.uk/landregistry/query"
+# SPARQL JSON results can be large; ask for them compressed
+_SPARQL_HEADERS = {"Accept": "application/sparql-results+json", "Accept-Encoding": "gzip"}
+
+# The district average is taken over at most the DISTRICT_SAMPLE_SIZE most recent sales from
+# the last DISTRICT_SAMPLE_YEARS, so it reflects current prices rather than storage order
+DISTRICT_SAMPLE_SIZE = 1000
+DISTRICT_SAMPLE_YEARS = 3
+
+async def with_retry(coro_factory, attempts: int = 2, base: float = 0.1) -> httpx.Response:
+    """
+    Await coro_factory() up to `attempts` times, retrying transport errors and 5xx responses
+    after a short jittered exponential backoff. The last response or error is returned/raised.
+    """
+    for i in range(attempts):
+        last = i == attempts - 1
+        try:
+            response = await coro_factory()
+        except httpx.TransportError:
+            if last:
+                raise
+        else:
+            if response.status_code < 500 or last:
+                return response
+        await asyncio.sleep(base * 2 ** i + random.random() * base)
+
+async def _post_sparql(query: str) -> httpx.Response:
+    return await with_retry(lambda: _http().post(
+        LAND_REGISTRY_SPARQL_URL,
+        data={"query": query},
+        headers=_SPARQL_HEADERS
+    ))
+
+def _sparql_string(value: str) -> str:
+    """Quote a value as a SPARQL string literal so user input can't alter the query."""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+# Recorded sales and EPC lodgements change on a scale of weeks, so repeat lookups reuse results:
+# sales for a week, EPC searches and certificate recommendations for a day
+_sales_cache = TTLCache(maxsize=20_000, ttl=7 * 86400, name="land_registry_sales_v2")  # v2: flat (amount, paon, saon) rows
+# District averages aggregate recent sales over ~2,600 outward codes; a month is fresh enough
+_district_cache = TTLCache(maxsize=5_000, ttl=30 * 86400, name="land_registry_district_v2")  # v2: recent sales only
+_postcode_avg_cache = TTLCache(maxsize=20_000, ttl=7 * 86400, name="land_registry_postcode_avg")
+_epc_search_cache = TTLCache(maxsize=20_000, ttl=86400, name="epc_search")
+_epc_recommendations_cache = TTLCache(maxsize=20_000, ttl=86400, name="epc_recommendations")
+# (current band, lmk key) of the certificate matched to each "<postcode>:<house number>"
+_epc_match_cache = TTLCache(maxsize=50_000, ttl=86400, name="epc_match")
+
+async def aclose() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+@dataclass(frozen=True, slots=True)
+class PropertyKey:
+    """An address and postcode normalised once, shared by the Land Registry and EPC lookups."""
+    address: str
+    clean_postcode: str
+    outward_code: str
+    house_num: Optional[str]
+
+    @classmethod
+    def parse(cls, address: str, postcode: str) -> "PropertyKey":
+        clean_postcode = postcode.strip().upper()
+        if " " not in clean_postcode and len(clean_postcode) > 3:
+            clean_postcode = f"{clean_postcode[:-3]} {clean_postcode[-3:]}"
+
+        match = _HOUSE_NUM_RE.search(address)
+        return cls(
+            address=address,
+            clean_postcode=clean_postcode,
+            outward_code=clean_postcode.split(" ")[0],
+            house_num=match.group(1).upper() if match else None
+        )
+
+    @property
+    def postcode_key(self) -> str:
+        return self.clean_postcode.replace(" ", "")
+
+@single_flight(lambda key: key.outward_code)
+async def fetch_district_average_price(key: PropertyKey) -> Optional[float]:
+    """
+    Queries HM Land Registry for the average price in the postcode district (e.g., N11),
+    over its most recent sales from the last few years.
+    """
+    outward_code = key.outward_code
+    cached = _district_cache.get(outward_code)
+    if cached is MISS:
+        return NATIONAL_AVERAGE_PRICE
+    if cached is not None:
+        return cached
     
+    since = (date.today() - timedelta(days=365 * DISTRICT_SAMPLE_YEARS)).isoformat()
     query = f"""
     PREFIX lrppi: <http://landregistry.data.gov.uk/def/ppi/>
     PREFIX lrcommon: <http://landregistry.data.gov.uk/def/common/>
+    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
     SELECT (AVG(?amount) as ?avgPrice)
     WHERE {{
-      ?transx lrppi:pricePaid ?amount ;
-              lrppi:propertyAddress ?addr .
-      ?addr lrcommon:postcode ?pc .
-      FILTER(STRSTARTS(STR(?pc), "{outward_code} "))
+      {{
+        SELECT ?amount
+        WHERE {{
+          ?transx lrppi:pricePaid ?amount ;
+                  lrppi:transactionDate ?date ;
+                  lrppi:propertyAddress ?addr .
+          ?addr lrcommon:postcode ?pc .
+          FILTER(STRSTARTS(STR(?pc), {_sparql_string(outward_code + " ")}))
+          FILTER(?date >= "{since}"^^xsd:date)
+        }}
+        ORDER BY DESC(?date)
+        LIMIT {DISTRICT_SAMPLE_SIZE}
+      }}
     }}
     """
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                "http://landregistry.data.gov.uk/landregistry/query",
-                data={"query": query},
-                headers={"Accept": "application/sparql-results+json"}
-            )
-            if response.status_code == 200:
-                data = response.json()
-                results = data.get("results", {}).get("bindings", [])
-                if results and "avgPrice" in results[0] and "value" in results[0]["avgPrice"]:
-                    avg_price = float(results[0]["avgPrice"]["value"])
-                    print(f"[Land Registry API] Found district average: £{avg_price:,.2f} for {outward_code}")
-                    return avg_price
+        response = await _post_sparql(query)
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            results = data.get("results", {}).get("bindings", [])
+            if results and "avgPrice" in results[0] and "value" in results[0]["avgPrice"]:
+                avg_price = float(results[0]["avgPrice"]["value"])
+                logger.info("[Land Registry API] Found district average: £%.2f for %s", avg_price, outward_code)
+                _district_cache.set(outward_code, avg_price)
+                return avg_price
+            _district_cache.set(outward_code, MISS, ttl=MISS_TTL)
     except Exception as e:
-        print(f"[Land Registry API] Error fetching district average: {e}")
+        logger.warning("[Land Registry API] Error fetching district average: %s", e)
         
-    return 285000.0 # Ultimate fallback: UK National Average
+    return NATIONAL_AVERAGE_PRICE # Ultimate fallback
 
-async def fetch_land_registry_price(address: str, postcode: str) -> Optional[float]:
-    """Queries HM Land Registry for recent sales, attempting to find the specific house."""
-    clean_postcode = postcode.strip().upper()
-    if " " not in clean_postcode and len(clean_postcode) > 3:
-        clean_postcode = f"{clean_postcode[:-3]} {clean_postcode[-3:]}"
-        
-    match = re.search(r'\b(\d+[A-Za-z]?)\b', address)
-    house_num = match.group(1).upper() if match else None
+@single_flight(lambda clean_postcode: clean_postcode)
+async def _load_sales_rows(clean_postcode: str) -> Optional[List[Tuple[Optional[str], str, str]]]:
+    """(amount, PAON, SAON) for the 100 most recent sales in a postcode, from cache or Land Registry."""
+    results = _sales_cache.get(clean_postcode)
+    if results is not None:
+        return results
 
     # Fetch top 100 recent sales in the postcode
     query = f"""
@@ -65,200 +193,269 @@ async def fetch_land_registry_price(address: str, postcode: str) -> Optional[flo
       ?transx lrppi:pricePaid ?amount ;
               lrppi:transactionDate ?date ;
               lrppi:propertyAddress ?addr .
-      ?addr lrcommon:postcode "{clean_postcode}" .
+      ?addr lrcommon:postcode {_sparql_string(clean_postcode)} .
       OPTIONAL {{ ?addr lrcommon:paon ?paon . }}
       OPTIONAL {{ ?addr lrcommon:saon ?saon . }}
     }}
     ORDER BY DESC(?date)
     LIMIT 100
     """
+    response = await _post_sparql(query)
+    if response.status_code != 200:
+        return None
+
+    data = orjson.loads(response.content)
+    # Keep only the three values matching needs, as flat (amount, PAON, SAON) rows,
+    # instead of holding the nested SPARQL binding dicts in the cache
+    results = [
+        (
+            b.get("amount", {}).get("value"),
+            b.get("paon", {}).get("value", "").upper(),
+            b.get("saon", {}).get("value", "").upper(),
+        )
+        for b in data.get("results", {}).get("bindings", [])
+    ]
+    # No recorded sales is cached briefly too, so retries don't re-run the query
+    _sales_cache.set(clean_postcode, results, ttl=None if results else MISS_TTL)
+    return results
+
+async def _price_from_sales(key: PropertyKey) -> Optional[float]:
+    """
+    Most recent sale of the property itself, matched on PAON or SAON among recent postcode sales,
+    falling back to the average of those same sales.
+    """
+    clean_postcode = key.clean_postcode
+    house_num = key.house_num
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "http://landregistry.data.gov.uk/landregistry/query",
-                data={"query": query},
-                headers={"Accept": "application/sparql-results+json"}
-            )
-            if response.status_code == 200:
-                data = response.json()
-                results = data.get("results", {}).get("bindings", [])
-                
-                if results:
-                    # 1. Try to find the exact house number (PAON or SAON)
-                    if house_num:
-                        for r in results:
-                            paon = r.get("paon", {}).get("value", "").upper()
-                            saon = r.get("saon", {}).get("value", "").upper()
-                            if house_num == paon or house_num == saon:
-                                price = float(r["amount"]["value"])
-                                print(f"[Land Registry API] Found exact sale for '{house_num}' at {clean_postcode}: £{price:,.2f}")
-                                return price
-                    
-                    # 2. If exact match not found, compute average of recent sales in the postcode 
-                    # (Much more accurate than picking a random neighbor's sale)
-                    prices = [float(r["amount"]["value"]) for r in results]
-                    avg_price = sum(prices) / len(prices)
-                    print(f"[Land Registry API] Exact property not found. Using recent average for {clean_postcode}: £{avg_price:,.2f}")
-                    return avg_price
-                    
+        rows = await _load_sales_rows(clean_postcode) or []
+        for amount, paon, saon in rows:
+            if house_num == paon or house_num == saon:
+                price = float(amount)
+                logger.info("[Land Registry API] Found exact sale for '%s' at %s: £%.2f", house_num, clean_postcode, price)
+                return price
+
+        prices = [float(amount) for amount, _, _ in rows if amount is not None]
+        if prices:
+            avg_price = sum(prices) / len(prices)
+            logger.info("[Land Registry API] Exact property not found. Using recent average for %s: £%.2f", clean_postcode, avg_price)
+            return avg_price
+    except Exception as e:
+        logger.warning("[Land Registry API] Error fetching data: %s", e)
+    return None
+
+@single_flight(lambda key: key.clean_postcode)
+async def _fetch_recent_average(key: PropertyKey) -> Optional[float]:
+    """Average of the 100 most recent sales in the postcode, computed by the SPARQL endpoint."""
+    clean_postcode = key.clean_postcode
+    cached = _postcode_avg_cache.get(clean_postcode)
+    if cached is MISS:
+        return None
+    if cached is not None:
+        return cached
+
+    query = f"""
+    PREFIX lrppi: <http://landregistry.data.gov.uk/def/ppi/>
+    PREFIX lrcommon: <http://landregistry.data.gov.uk/def/common/>
+    SELECT (AVG(?amount) as ?avgPrice)
+    WHERE {{
+      {{
+        SELECT ?amount
+        WHERE {{
+          ?transx lrppi:pricePaid ?amount ;
+                  lrppi:transactionDate ?date ;
+                  lrppi:propertyAddress ?addr .
+          ?addr lrcommon:postcode {_sparql_string(clean_postcode)} .
+        }}
+        ORDER BY DESC(?date)
+        LIMIT 100
+      }}
+    }}
+    """
+    try:
+        response = await _post_sparql(query)
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            results = data.get("results", {}).get("bindings", [])
+            if results and "avgPrice" in results[0] and "value" in results[0]["avgPrice"]:
+                avg_price = float(results[0]["avgPrice"]["value"])
+                _postcode_avg_cache.set(clean_postcode, avg_price)
+                return avg_price
+            _postcode_avg_cache.set(clean_postcode, MISS, ttl=MISS_TTL)
     except Exception as e:
-        print(f"[Land Registry API] Error fetching data: {e}")
+        logger.warning("[Land Registry API] Error fetching postcode average: %s", e)
     return None
 
+async def fetch_land_registry_price(key: PropertyKey) -> Optional[float]:
+    """Queries HM Land Registry for recent sales, attempting to find the specific house."""
+    if key.house_num:
+        # 1. Try to find the exact house number (PAON or SAON), else average the rows already fetched
+        return await _price_from_sales(key)
+
+    # 2. Without a house number only the average of recent sales in the postcode is needed,
+    # which the endpoint computes and returns as a single row
+    avg_price = await _fetch_recent_average(key)
+    if avg_price:
+        logger.info("[Land Registry API] No house number. Using recent average for %s: £%.2f", key.clean_postcode, avg_price)
+    return avg_price
+
+@single_flight(lambda lmk_key, headers: lmk_key)
 async def fetch_epc_recommendations(lmk_key: str, headers: dict) -> List[Dict[str, Any]]:
     """Fetches the actual assessor recommendations for a specific EPC certificate."""
+    cached = _epc_recommendations_cache.get(lmk_key)
+    if cached is not None:
+        return cached
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://epc.opendatacommunities.org/api/v1/domestic/recommendations/{lmk_key}",
-                headers=headers
-            )
-            if response.status_code == 200:
-                return response.json().get('rows', [])
+        response = await _http().get(
+            f"https://epc.opendatacommunities.org/api/v1/domestic/recommendations/{lmk_key}",
+            headers=headers
+        )
+        if response.status_code == 200:
+            rows = orjson.loads(response.content).get('rows', [])
+            _epc_recommendations_cache.set(lmk_key, rows)
+            return rows
     except Exception as e:
-        print(f"[EPC API] Error fetching recommendations: {e}")
+        logger.warning("[EPC API] Error fetching recommendations: %s", e)
     return []
 
-# Update the function signature to accept both address and postcode
-async def fetch_property_context(address: str, postcode: str) -> Tuple[str, float, List[Dict[str, Any]]]:
+@single_flight(lambda key, headers: key.postcode_key)
+async def _load_epc_rows(key: PropertyKey, headers: dict) -> Optional[List[Dict[str, Any]]]:
+    """EPC certificates lodged in the postcode, from cache or the EPC search API."""
+    rows = _epc_search_cache.get(key.postcode_key)
+    if rows is not None:
+        return rows
+
+    # Query EPC by Postcode instead of full address string
+    response = await _http().get(
+        "https://epc.opendatacommunities.org/api/v1/domestic/search",
+        params={"postcode": key.clean_postcode, "size": 100},
+        headers=headers
+    )
+    if response.status_code != 200:
+        return None
+
+    rows = orjson.loads(response.content).get('rows', [])
+    _epc_search_cache.set(key.postcode_key, rows, ttl=None if rows else MISS_TTL)
+    return rows
+
+@lru_cache(maxsize=1)
+def _epc_headers() -> Optional[Dict[str, str]]:
+    """
+    EPC API auth headers, built once. Read on first use rather than at import,
+    since main loads .env after importing the helpers. Callers must not mutate the dict.
+    """
+    epc_api_key = os.getenv("EPC_API_KEY")
+    if not epc_api_key:
+        return None
+    encoded_key = base64.b64encode(epc_api_key.encode('utf-8')).decode('utf-8')
+    return {
+        "Authorization": f"Basic {encoded_key}",
+        "Accept": "application/json"
+    }
+
+async def fetch_epc_context(key: PropertyKey) -> Tuple[str, List[Dict[str, Any]]]:
+    """Current EPC band and assessor recommendations for the property, defaulting to D."""
     current_epc = 'D' # Default baseline
     recommendations = []
-    
-    # Land registry now uses both address and postcode to find the exact property
-    property_value = await fetch_land_registry_price(address, postcode)
-    if not property_value:
-        property_value = await fetch_district_average_price(postcode)
-    
-    epc_api_key = os.getenv("EPC_API_KEY")
-    if epc_api_key:
-        encoded_key = base64.b64encode(epc_api_key.encode('utf-8')).decode('utf-8')
-        headers = {
-            "Authorization": f"Basic {encoded_key}",
-            "Accept": "application/json"
-        }
-        
-        match = re.search(r'\b(\d+[A-Za-z]?)\b', address)
-        house_num = match.group(1).upper() if match else None
+
+    headers = _epc_headers()
+    if headers:
+        house_num = key.house_num
 
         try:
-            async with httpx.AsyncClient() as client:
-                # Query EPC by Postcode instead of full address string
-                response = await client.get(
-                    "https://epc.opendatacommunities.org/api/v1/domestic/search",
-                    params={"postcode": postcode, "size": 100},
-                    headers=headers
-                )
-                if response.status_code == 200:
-                    rows = response.json().get('rows', [])
+            # A property's matched certificate is cached on its own, so repeat lookups
+            # skip both the postcode search and re-indexing its rows
+            match_key = f"{key.postcode_key}:{house_num}"
+            match = _epc_match_cache.get(match_key) if house_num else None
+            if match is None:
+                rows = await _load_epc_rows(key, headers)
+                if rows is not None:
                     best_match = None
-                    
+
                     if house_num and rows:
-                        for row in rows:
-                            addr1 = row.get("address1", "").upper()
-                            addr_full = row.get("address", "").upper()
-                            # Check if the primary address line starts with the house number
-                            if addr1.startswith(house_num) or f" {house_num} " in f" {addr_full} ":
-                                best_match = row
-                                break
+                        # One pass over the rows indexes them by leading/word house number
+                        best_match = index_rows_by_house_number(rows).get(house_num)
 
                     if best_match:
-                        current_epc = best_match.get('current-energy-rating', 'D').upper()
-                        print(f"[EPC API] Found exact rating {current_epc} for {address}")
-                        
-                        lmk_key = best_match.get('lmk-key')
-                        if lmk_key:
-                            recommendations = await fetch_epc_recommendations(lmk_key, headers)
-                            print(f"[EPC API] Found {len(recommendations)} official recommendations")
+                        match = (best_match.get('current-energy-rating', 'D').upper(), best_match.get('lmk-key'))
                     else:
-                        print(f"[EPC API] Could not find exact house '{house_num}' in {postcode}. Defaulting to D.")
+                        match = MISS
+                    if house_num:
+                        _epc_match_cache.set(match_key, match, ttl=MISS_TTL if match is MISS else None)
+
+            if match is MISS:
+                logger.info("[EPC API] Could not find exact house '%s' in %s. Defaulting to D.", house_num, key.clean_postcode)
+            elif match is not None:
+                current_epc, lmk_key = match
+                logger.info("[EPC API] Found exact rating %s for %s", current_epc, key.address)
+
+                if lmk_key:
+                    recommendations = await fetch_epc_recommendations(lmk_key, headers)
+                    logger.info("[EPC API] Found %d official recommendations", len(recommendations))
         except Exception as e:
-            print(f"[EPC API] Error: {e}")
+            logger.warning("[EPC API] Error: %s", e)
+
+    return current_epc, recommendations
 
+async def fetch_property_context(address: str, postcode: str) -> Tuple[str, float, List[Dict[str, Any]]]:
+    """
+    Property value and EPC context. The property sale, district average and EPC lookups
+    don't depend on each other, so they run together and the district average is only
+    used when Land Registry has no sales for the postcode.
+    """
+    key = PropertyKey.parse(address, postcode)
+    sale_price, district_price, (current_epc, recommendations) = await asyncio.gather(
+        # Land registry now uses both address and postcode to find the exact property
+        fetch_land_registry_price(key),
+        fetch_district_average_price(key),
+        fetch_epc_context(key)
+    )
+    property_value = sale_price or district_price
     return current_epc, property_value, recommendations
 
+def index_recommendations(
+    recommendations: Optional[List[Dict[str, Any]]],
+    current_energy_rating: str
+) -> Dict[str, str]:
+    """
+    Map each improvement type to the band its first EPC recommendation reaches,
+    keeping only recommendations that improve on the current rating.
+    One keyword scan per recommendation covers every improvement type.
+    """
+    current_index = EPC_BAND_INDEX[current_energy_rating]
+    index = {}
+    for rec in recommendations or []:
+        rec_band = rec.get("potential-energy-rating", "").upper()
+        rec_index = EPC_BAND_INDEX.get(rec_band)
+        # Only accept it if it actually improves the rating
+        if rec_index is None or rec_index <= current_index:
+            continue
+        for improvement_key in match_improvement_types(rec.get("improvement-item", "")):
+            index.setdefault(improvement_key, rec_band)
+    return index
+
 def calculate_value_increase(
     improvement_type: str, 
     estimated_cost: float, 
     current_energy_rating: str, 
     property_value: Optional[float] = None,
-    recommendations: Optional[List[Dict[str, Any]]] = None
+    recommendations: Optional[List[Dict[str, Any]]] = None,
+    recommendation_index: Optional[Dict[str, str]] = None
 ) -> Tuple[float, str]:
-    """Calculates ROI using real EPC recommendations where available, with a static fallback."""
+    """
+    Calculates ROI using real EPC recommendations where available, with a static fallback.
+    Pass a prebuilt index_recommendations() result when valuing several improvements.
+    """
     improvement_key = improvement_type.lower()
-    current_index = EPC_BANDS.index(current_energy_rating)
-    
-    new_epc = None
-    used_real_recommendation = False
+    current_index = EPC_BAND_INDEX[current_energy_rating]
     
+    if recommendation_index is None:
+        recommendation_index = index_recommendations(recommendations, current_energy_rating)
+
     # 1. Check if the improvement is officially recommended and get its exact band jump
-    if recommendations:
-        # Keywords map our front-end terms to the EPC API descriptions
-        EPC_KEYWORD_MAP = {
-            "solar": [
-                "solar", "photovoltaic", "pv", "pv panel",
-                "solar panel", "solar pv", "photovoltaics"
-            ],
-
-            "insulation": [
-                "insulation", "wall insulation", "external wall",
-                "cavity wall", "loft insulation", "roof insulation"
-            ],
-
-            "windows": [
-                "window", "windows", "double glazing",
-                "triple glazing", "glazing", "u-value",
-                "energy efficient windows"
-            ],
-
-            "heat_pump": [
-                "heat pump", "air source", "ground source",
-                "ashp", "gshp",
-                "air source heat pump",
-                "ground source heat pump"
-            ],
-
-            "battery": [
-                "battery storage", "home battery",
-                "powerwall", "battery unit",
-                "energy storage system",
-                "tesla battery"
-            ],
-
-            "loft_conversion": [
-                "loft conversion", "roof extension",
-                "dormer", "mansard",
-                "roof enlargement", "attic conversion"
-            ],
-
-            "cladding": [
-                "external cladding", "render",
-                "external wall finish",
-                "facade upgrade", "wall rendering",
-                "external insulation system"
-            ],
-
-            "ev_charger": [
-                "electric vehicle charger",
-                "ev charger",
-                "charging point",
-                "vehicle charging",
-                "car charging point",
-                "ev installation"
-            ]
-        }
-        keywords = EPC_KEYWORD_MAP.get(improvement_key, [])
-        
-        for rec in recommendations:
-            item = rec.get("improvement-item", "").lower()
-            if any(kw in item for kw in keywords):
-                rec_band = rec.get("potential-energy-rating", "").upper()
-                if rec_band in EPC_BANDS:
-                    rec_index = EPC_BANDS.index(rec_band)
-                    # Only accept it if it actually improves the rating
-                    if rec_index > current_index:
-                        new_epc = rec_band
-                        used_real_recommendation = True
-                        break
+    new_epc = recommendation_index.get(improvement_key)
+    used_real_recommendation = new_epc is not None
+    if new_epc:
+        new_index = EPC_BAND_INDEX[new_epc]
 
     # 2. Fallback to hardcoded estimates if it wasn't recommended or no EPC data found
     if not new_epc:
@@ -266,9 +463,7 @@ def calculate_value_increase(
         new_index = min(current_index + band_jump, len(EPC_BANDS) - 1)
         new_epc = EPC_BANDS[new_index]
     
-    current_premium = EPC_PREMIUMS[current_energy_rating]
-    new_premium = EPC_PREMIUMS[new_epc]
-    net_premium_increase = new_premium - current_premium
+    net_premium_increase = EPC_PREMIUM_DELTA[current_index][new_index]
     
     if property_value:
         value_increase = property_value * net_premium_increase
@@ -280,7 +475,7 @@ def calculate_value_increase(
             explanation = f"Estimated to boost EPC from {current_energy_rating} to {new_epc}. Based on a {(net_premium_increase*100):.1f}% market premium on local property value (£{property_value:,.0f})."
     else:
         # Failsafe logic
-        value_increase = 285000 * net_premium_increase
+        value_increase = NATIONAL_AVERAGE_PRICE * net_premium_increase
         explanation = f"Boosts EPC from {current_energy_rating} to {new_epc}. Estimated {(net_premium_increase*100):.1f}% green premium (Using national average value)."
     
     if value_increase <= 0:
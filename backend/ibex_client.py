@@ -1,8 +1,17 @@
 import httpx
+import logging
+import orjson
 from typing import Dict, Any, Optional, List
 import os
 from datetime import date
+from helpers.cache import TTLCache
 
+logger = logging.getLogger(__name__)
+
+# Searches return at most PAGE_SIZE applications per page; while pages come back full the
+# next one is requested, up to MAX_PAGES in total
+PAGE_SIZE = 1000
+MAX_PAGES = 5
 
 
 class IBexClient:
@@ -13,6 +22,66 @@ class IBexClient:
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        self._http: Optional[httpx.AsyncClient] = None
+        # Council stats for a fixed date window are effectively static; keep them for an hour
+        self._stats_cache = TTLCache(maxsize=1024, ttl=3600)
+
+    def _new_http_client(self) -> httpx.AsyncClient:
+        # Auth headers and base URL live on the client, so each call only sends its path and payload
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            timeout=30.0,
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+
+    async def startup(self) -> None:
+        """Open the pooled HTTP client shared by every IBex call."""
+        if self._http is None:
+            self._http = self._new_http_client()
+
+    async def shutdown(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # Built on first use if startup() wasn't called, so calls never fall back to one-off clients
+        if self._http is None:
+            self._http = self._new_http_client()
+        return self._http
+
+    async def _post_json(self, path: str, payload: Dict[str, Any]) -> Any:
+        response = await self.http.post(path, content=orjson.dumps(payload))
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    async def _search_pages(self, path: str, payload: Dict[str, Any]) -> Any:
+        """
+        POST a paged search, requesting the next page only while the last one came back
+        full, so no request is made past the first short page.
+        """
+        data = await self._post_json(path, payload)
+        if not isinstance(data, list):
+            return data
+
+        page_results = data
+        page = 1
+        while len(page_results) >= PAGE_SIZE:
+            if page == MAX_PAGES:
+                logger.warning(
+                    "IBex %s search hit the %d-page cap; results beyond %d applications were not fetched",
+                    path, MAX_PAGES, len(data)
+                )
+                break
+            page += 1
+            page_results = await self._post_json(path, {**payload, "input": {**payload["input"], "page": page}})
+            if not isinstance(page_results, list):
+                break
+            data.extend(page_results)
+        return data
 
     async def search_by_address(self, address_query: str) -> Optional[Dict[str, Any]]:
         search_terms = [address_query.strip()]
@@ -23,37 +92,33 @@ class IBexClient:
             # Assumes the postcode is at the end of the string
             search_terms.append(" ".join(words[-2:])) 
             
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            for term in search_terms:
-                payload = {
-                    "input": {
-                        "page": 1,
-                        "page_size": 10,
-                        "date_range_type": "validated",
-                        "date_from": "2010-01-01",
-                        "date_to": date.today().isoformat()
-                    },
-                    "filters": {
-                        "keywords": [term] 
-                    },
-                    "extensions": {
-                        "centre_point": True,
-                        "geometry": True
-                    }
+        date_to = date.today().isoformat()
+        for term in search_terms:
+            payload = {
+                "input": {
+                    "page": 1,
+                    "page_size": 10,
+                    "date_range_type": "validated",
+                    "date_from": "2010-01-01",
+                    "date_to": date_to
+                },
+                "filters": {
+                    "keywords": [term] 
+                },
+                "extensions": {
+                    "centre_point": True,
+                    "geometry": True
                 }
+            }
             
-                response = await client.post(
-                    f"{self.base_url.rstrip('/')}/applications",
-                    headers=self.headers,
-                    json=payload
-                )
+            response = await self.http.post("/applications", content=orjson.dumps(payload))
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    if isinstance(data, list) and len(data) > 0:
-                        for match in data:
-                            if match.get("geometry"):
-                                return match
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                if isinstance(data, list) and len(data) > 0:
+                    for match in data:
+                        if match.get("geometry"):
+                            return match
         return None
     
     async def search_by_location(
@@ -72,7 +137,7 @@ class IBexClient:
                 "coordinates": [longitude, latitude],
                 "radius": radius,
                 "page": 1,
-                "page_size": 1000
+                "page_size": PAGE_SIZE
             }
         }
         
@@ -101,18 +166,11 @@ class IBexClient:
         if filters:
             payload["filters"] = filters
         
-        print(f"[IBex] Searching location: ({latitude}, {longitude}), radius: {radius}m")
+        logger.debug("[IBex] Searching location: (%s, %s), radius: %sm", latitude, longitude, radius)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{self.base_url}/search",
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
-            print(f"[IBex] Found {len(data) if isinstance(data, list) else 'unknown'} applications")
-            return data
+        data = await self._search_pages("/search", payload)
+        logger.debug("[IBex] Found %s applications", len(data) if isinstance(data, list) else "unknown")
+        return data
     
     async def search_by_council(
         self,
@@ -129,7 +187,7 @@ class IBexClient:
                 "date_to": date_to,
                 "council_id": council_ids,
                 "page": 1,
-                "page_size": 1000
+                "page_size": PAGE_SIZE
             }
         }
         
@@ -150,18 +208,11 @@ class IBexClient:
         if filters:
             payload["filters"] = filters
         
-        print(f"[IBex] Searching councils: {council_ids}, dates: {date_from} to {date_to}")
+        logger.debug("[IBex] Searching councils: %s, dates: %s to %s", council_ids, date_from, date_to)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{self.base_url}/applications",
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
-            print(f"[IBex] Found {len(data) if isinstance(data, list) else 'unknown'} applications")
-            return data
+        data = await self._search_pages("/applications", payload)
+        logger.debug("[IBex] Found %s applications", len(data) if isinstance(data, list) else "unknown")
+        return data
     
     async def get_council_stats(
         self,
@@ -177,15 +228,16 @@ class IBexClient:
             }
         }
         
-        print(f"[IBex] Getting stats for council {council_id}")
+        cache_key = f"{council_id}:{date_from}:{date_to}"
+        cached = self._stats_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        logger.debug("[IBex] Getting stats for council %s", council_id)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{self.base_url}/stats",
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
-            print(f"[IBex] Retrieved council stats")
-            return data
+        response = await self.http.post("/stats", content=orjson.dumps(payload))
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        logger.debug("[IBex] Retrieved council stats")
+        self._stats_cache.set(cache_key, data)
+        return data
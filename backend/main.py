@@ -1,34 +1,95 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from contextlib import asynccontextmanager, suppress
+from functools import lru_cache
+import asyncio
+import atexit
+import httpx
+import logging
+import orjson
+from logging.handlers import QueueHandler, QueueListener
 import os
+import queue
 import re
 from dotenv import load_dotenv
-import httpx
-from models import PropertyAnalysisResponse, ImprovementAnalysis, AddressAnalysisRequest, EnergyCompliance
+from typing import List
+from models import PropertyAnalysisResponse, ImprovementAnalysis, AddressAnalysisRequest, BatchAnalysisResult, EnergyCompliance
 from ibex_client import IBexClient
 from helpers.ibex_service import fetch_planning_applications
-from helpers.application_filter import filter_by_improvement_type
-from helpers.timeline_calculator import calculate_average_approval_time, extract_examples
+from helpers.application_filter import classify_applications_async
+from helpers.timeline_calculator import summarize_applications
 from helpers.cost_calculator import calculate_cost, check_budget
-from helpers.value_calculator import calculate_value_increase, fetch_property_context
-from helpers.roi_calculator import calculate_roi
-from helpers.feasibility_calculator import calculate_feasibility
 from helpers.summary_generator import generate_summary
-from helpers.epcClient import EPCClient
+from helpers.epcClient import EPC_BAND_TO_NUMERIC, EPCClient
+from helpers import cache, feasibility_calculator, geocoding, value_calculator
 from helpers.roi_calculator import calculate_roi, get_environmental_impact
 
 load_dotenv()
 
+# Handlers only enqueue records; a listener thread does the formatting and stderr writes,
+# so logging never blocks the event loop
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = QueueListener(_log_queue, _log_stream)
+_log_listener.start()
+atexit.register(_log_listener.stop)  # flush queued records on exit
+_log_queue_handler = QueueHandler(_log_queue)
+# The listener's handler does the real formatting; without this basicConfig would
+# give the queue handler its default format and every line would be formatted twice
+_log_queue_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    handlers=[_log_queue_handler]
+)
+# httpx logs every outbound request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Opt-in: with CACHE_DB_PATH set, upstream results (which include the addresses users searched
+    # for) are persisted to that SQLite file and warmed from it; by default caches are in memory only
+    cache_db_path = os.getenv("CACHE_DB_PATH", "")
+    if cache_db_path:
+        await asyncio.to_thread(cache.attach_store, cache_db_path)
+    # One IBex client (and connection pool) for the app's lifetime, handed to handlers via get_ibex
+    app.state.ibex = IBexClient(IBEX_API_KEY, IBEX_BASE_URL)
+    await app.state.ibex.startup()
+    yield
+    # Close pooled upstream connections on shutdown
+    await app.state.ibex.shutdown()
+    await epc_client.aclose()
+    await geocoding.aclose()
+    await feasibility_calculator.aclose()
+    await value_calculator.aclose()
+    # Waits for the store's queued writes, so keep it off the event loop
+    await asyncio.to_thread(cache.detach_store)
+
 app = FastAPI(
     title="Proptech ROI Analysis API",
     description="Cost-benefit analysis for property energy efficiency upgrades",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # The analysis responses are deeply nested; orjson encodes them much faster than stdlib json
+    default_response_class=ORJSONResponse
 )
 
+# Comma-separated list of frontend origins; unset means any origin
+_cors_origins_env = os.getenv("CORS_ALLOW_ORIGINS", "")
+CORS_ALLOW_ORIGINS = [origin.strip() for origin in _cors_origins_env.split(",") if origin.strip()] or ["*"]
+# With credentials Starlette echoes back whatever origin asked, so "*" would let any site make
+# credentialed calls; cookies and auth headers are only allowed once the origins are listed explicitly
+CORS_ALLOW_CREDENTIALS = "*" not in CORS_ALLOW_ORIGINS
+if _cors_origins_env.strip() and not CORS_ALLOW_CREDENTIALS:
+    logger.warning("CORS_ALLOW_ORIGINS includes '*', so credentialed cross-origin requests are disabled")
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
+    allow_origins=CORS_ALLOW_ORIGINS,
+    allow_credentials=CORS_ALLOW_CREDENTIALS,
     allow_methods=["*"],
     allow_headers=["*"],
 )
@@ -36,97 +97,124 @@ app.add_middleware(
 IBEX_API_KEY = os.getenv("IBEX_API_KEY", "")
 IBEX_BASE_URL = os.getenv("IBEX_BASE_URL", "https://ibex.seractech.co.uk")
 MAPBOX_TOKEN = os.getenv("MAPBOX_TOKEN", "")
+# Run each request's per-improvement analysis on a worker thread (worth it for big concurrent batches)
+USE_WORKER_THREADS = os.getenv("USE_WORKER_THREADS", "") == "1"
 
-ibex_client = IBexClient(IBEX_API_KEY, IBEX_BASE_URL)
-epc_client = EPCClient()
+# Numeric EPC band a projection must reach to count as compliant (C)
+COMPLIANCE_TARGET = EPC_BAND_TO_NUMERIC["C"]
 
-EPC_BAND_TO_NUMERIC = {"A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7}
-NUMERIC_TO_EPC_BAND = {v: k for k, v in EPC_BAND_TO_NUMERIC.items()}
+# Offered, in this order, when the chosen improvements don't reach the compliance target
+SUGGESTED_IMPROVEMENTS = ("insulation", "heat_pump", "solar", "windows")
 
-@app.get("/api/config")
-def get_config():
-    return {"mapboxToken": MAPBOX_TOKEN}
+# Case-insensitive so the whole address isn't upper-cased just to find the postcode
+POSTCODE_RE = re.compile(r'[A-Z]{1,2}\d[A-Z\d]? ?\d[A-Z]{2}', re.IGNORECASE)
 
-@app.post("/api/property/analyze-by-address", response_model=PropertyAnalysisResponse)
-async def analyze_by_address(request: AddressAnalysisRequest):
-    try:
-        # --- Step 1: Geocode address ---
-        headers = {"User-Agent": "ProptechAnalysisApp/1.0"}
-        params = {"q": request.address_query, "format": "json", "limit": 1, "countrycodes": "gb"}
+epc_client = EPCClient()
 
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            geo_res = await client.get("https://nominatim.openstreetmap.org/search", params=params, headers=headers)
-            geo_data = geo_res.json()
+@lru_cache(maxsize=4096)
+def project_epc(current_band: str, improvement: str) -> str:
+    """Projected band after a single improvement; only a handful of (band, improvement) pairs exist."""
+    return epc_client.estimate_epc_after_improvements(current_band=current_band, improvements=[improvement])
 
-        if not geo_data:
-            raise HTTPException(status_code=404, detail="Address not found.")
+def get_ibex(request: Request) -> IBexClient:
+    return request.app.state.ibex
 
-        latitude = float(geo_data[0]["lat"])
-        longitude = float(geo_data[0]["lon"])
-        display_name = geo_data[0]["display_name"]
-        
-        # --- Step 1.5: Extract Postcode ---
-        # We moved this UP so the EPC client can use it!
-        postcode_match = re.search(r'[A-Z]{1,2}\d[A-Z\d]? ?\d[A-Z]{2}', request.address_query.upper())
-        extracted_postcode = postcode_match.group(0) if postcode_match else request.address_query
+# Probed every few seconds by the frontend and load balancers, so the body is a prebuilt constant.
+# Kept async so probes never queue for the worker threads used by classification and analysis
+_HEALTH_RESPONSE = {"status": "healthy"}
 
-        # --- Step 2: Fetch property context (EPC Metrics) ---
-        # Pass both the raw address AND the clean postcode
-        property_metrics = await epc_client.get_property_metrics(request.address_query, extracted_postcode)
+@app.get("/health")
+async def health():
+    return _HEALTH_RESPONSE
 
-        current_energy_rating = property_metrics.get("current_energy_rating", "D")
+# Serialised once; each request gets its own Response so middleware can't alter a shared one
+_CONFIG_BODY = orjson.dumps({"mapboxToken": MAPBOX_TOKEN})
 
-        epc_per_improvement = {}
-        
-        for imp in request.desired_improvements:
-            projected = epc_client.estimate_epc_after_improvements(
-                current_band=current_energy_rating,
-                improvements=[imp]
+@app.get("/api/config")
+async def get_config():
+    return Response(content=_CONFIG_BODY, media_type="application/json")
+
+# Unknown timings, coordinates and emissions are left out of the JSON rather than sent as nulls
+@app.post("/api/property/analyze-by-address", response_model=PropertyAnalysisResponse, response_model_exclude_none=True)
+async def analyze_by_address(request: AddressAnalysisRequest, ibex: IBexClient = Depends(get_ibex)):
+    try:
+        # --- Step 1: Extract Postcode ---
+        # We moved this UP so the EPC client can use it!
+        postcode_match = POSTCODE_RE.search(request.address_query)
+        extracted_postcode = postcode_match.group(0).upper() if postcode_match else request.address_query
+
+        # --- Step 1.5: EPC metrics and value context ---
+        def start_address_lookups() -> asyncio.Future:
+            return asyncio.gather(
+                # Pass both the raw address AND the clean postcode
+                epc_client.get_property_metrics(request.address_query, extracted_postcode),
+                value_calculator.fetch_property_context(address=request.address_query, postcode=extracted_postcode)
             )
-            epc_per_improvement[imp] = projected
 
-        best_improvement = None
-        best_band_value = 999
+        # These need only the address and postcode, so with a postcode in the query they run while
+        # the address is geocoded. Without one they'd search on the whole address, so they wait
+        # until geocoding has shown the address exists
+        address_lookups = start_address_lookups() if postcode_match else None
+        try:
+            # --- Step 2: Geocode address ---
+            geo = await geocoding.geocode_address(request.address_query)
+
+            if not geo:
+                raise HTTPException(status_code=404, detail="Address not found.")
+
+            latitude = geo["latitude"]
+            longitude = geo["longitude"]
+            display_name = geo["display_name"]
+
+            if address_lookups is None:
+                address_lookups = start_address_lookups()
+
+            # --- Step 3: Planning applications and conservation area, which need the coordinates ---
+            applications, in_conservation_area = await asyncio.gather(
+                fetch_planning_applications(ibex, latitude, longitude),
+                # The conservation-area status is per location, so look it up once for all improvements
+                feasibility_calculator.check_conservation_area(latitude, longitude)
+            )
+            property_metrics, (current_epc, property_value, recommendations) = await address_lookups
+        except BaseException:
+            # Geocoding or IBex failed first: cancel the address lookups and reap the gather so it
+            # isn't logged as an unretrieved exception. Upstream fetches shared with other requests
+            # (single_flight) keep running for them and still fill the caches
+            if address_lookups is not None:
+                address_lookups.cancel()
+                with suppress(asyncio.CancelledError, Exception):
+                    await address_lookups
+            raise
 
-        for imp, band in epc_per_improvement.items():
-            band_value = EPC_BAND_TO_NUMERIC[band]
+        current_energy_rating = property_metrics.get("current_energy_rating", "D")
 
-            if band_value < best_band_value:
-                best_band_value = band_value
-                best_improvement = imp
+        epc_per_improvement = {imp: project_epc(current_energy_rating, imp) for imp in request.desired_improvements}
+        best_improvement = min(epc_per_improvement, key=lambda imp: EPC_BAND_TO_NUMERIC[epc_per_improvement[imp]])
 
         projected_epc = epc_per_improvement[best_improvement]
 
         # Compliance status
-        compliance_status = "ON TRACK" if EPC_BAND_TO_NUMERIC[projected_epc] <= EPC_BAND_TO_NUMERIC["C"] else "OFF TRACK"
+        compliance_status = "ON TRACK" if EPC_BAND_TO_NUMERIC[projected_epc] <= COMPLIANCE_TARGET else "OFF TRACK"
 
         # Optional: suggest remaining improvements not selected
         suggestions = []
         if compliance_status != "ON TRACK":
-            for imp in ["insulation", "heat_pump", "solar", "windows"]:
+            for imp in SUGGESTED_IMPROVEMENTS:
                 if imp not in request.desired_improvements:
                     suggestions.append(imp.capitalize())
         
-        # --- Step 2.5: Fetch Value Context ---
-        current_epc, property_value, recommendations = await fetch_property_context(
-            address=request.address_query, 
-            postcode=extracted_postcode
-        )
+        # Match the EPC recommendations to improvement types once for all improvements
+        recommendation_index = value_calculator.index_recommendations(recommendations, current_energy_rating)
 
-        # --- Step 3: Fetch local planning applications via IBex ---
-        applications = await fetch_planning_applications(ibex_client, latitude, longitude)
+        # One keyword pass over the applications buckets them for every desired improvement
+        matching_by_type = await classify_applications_async(applications, request.desired_improvements)
 
         # --- Step 4: Analyze each desired improvement ---
-        improvements_analysis = []
-        total_cost = 0
-        total_value_increase = 0
-        total_co2 = 0
-        total_kwh = 0
-
-        for improvement_type in request.desired_improvements:
-            matching = filter_by_improvement_type(applications, improvement_type)
-            avg_time = calculate_average_approval_time(matching)
-            examples = extract_examples(matching, property_metrics=property_metrics, limit=5)
+        def analyze_one(improvement_type: str) -> ImprovementAnalysis:
+            matching = matching_by_type[improvement_type]
+            # The conservation status is already known, so this needs no I/O
+            feasibility = feasibility_calculator.feasibility_rating(improvement_type, len(matching), in_conservation_area)
+            avg_time, examples = summarize_applications(matching, property_metrics=property_metrics, limit=5)
 
             estimated_cost, cost_explanation = calculate_cost(
                 improvement_type=improvement_type, 
@@ -134,27 +222,19 @@ async def analyze_by_address(request: AddressAnalysisRequest):
                 property_metrics=property_metrics
             )
 
-            value_increase, value_explanation = calculate_value_increase(
+            value_increase, value_explanation = value_calculator.calculate_value_increase(
                 improvement_type=improvement_type,
                 estimated_cost=estimated_cost,
                 current_energy_rating=current_energy_rating,
                 property_value=property_value,
-                recommendations=recommendations 
+                recommendation_index=recommendation_index
             )
 
             roi = calculate_roi(estimated_cost, value_increase)
             
-            # Make sure to await the function and pass the coordinates
-            feasibility = await calculate_feasibility(
-                improvement_type=improvement_type,
-                approved_count=len(matching),
-                latitude=latitude,
-                longitude=longitude
-            )
-            
             co2_kg, kwh = get_environmental_impact(improvement_type)
 
-            improvements_analysis.append(ImprovementAnalysis(
+            return ImprovementAnalysis(
                 improvement_type=improvement_type,
                 feasibility=feasibility,
                 approved_examples=len(matching),
@@ -166,12 +246,18 @@ async def analyze_by_address(request: AddressAnalysisRequest):
                 co2_savings_kg=co2_kg,
                 kwh_savings=kwh,
                 examples=examples
-            ))
+            )
+
+        def analyze_all() -> List[ImprovementAnalysis]:
+            return [analyze_one(improvement_type) for improvement_type in request.desired_improvements]
+
+        # The per-improvement analysis is pure CPU; under heavy concurrency it can be moved off the loop
+        improvements_analysis = await asyncio.to_thread(analyze_all) if USE_WORKER_THREADS else analyze_all()
 
-            total_cost += estimated_cost
-            total_value_increase += value_increase
-            total_co2 += co2_kg
-            total_kwh += kwh
+        total_cost = sum(imp.estimated_cost for imp in improvements_analysis)
+        total_value_increase = sum(imp.green_premium_value for imp in improvements_analysis)
+        total_co2 = sum(imp.co2_savings_kg for imp in improvements_analysis)
+        total_kwh = sum(imp.kwh_savings for imp in improvements_analysis)
 
         # --- Step 5: Final ROI & Budget Calculation ---
         total_roi = calculate_roi(total_cost, total_value_increase)
@@ -210,16 +296,72 @@ async def analyze_by_address(request: AddressAnalysisRequest):
             )
         )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        # Deliberate responses such as the 404 for an unknown address pass straight through
+        raise
+    except httpx.HTTPError as e:
+        logger.warning("Upstream request failed: %s", e)
+        raise HTTPException(status_code=502, detail="Upstream service error")
+    except Exception:
+        logger.exception("Analysis failed for %r", request.address_query)
+        raise HTTPException(status_code=500, detail="Internal error")
+
+# Addresses in a batch are analysed concurrently, capped so IBex and Nominatim aren't flooded
+BATCH_CONCURRENCY = 8
+MAX_BATCH_SIZE = 50
+
+@app.post("/api/property/analyze-batch", response_model=List[BatchAnalysisResult], response_model_exclude_none=True)
+async def analyze_batch(
+    requests: List[AddressAnalysisRequest],
+    http_request: Request,
+    ibex: IBexClient = Depends(get_ibex)
+):
+    if len(requests) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} addresses per batch.")
+
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def analyze_one(request: AddressAnalysisRequest) -> BatchAnalysisResult:
+        async with sem:
+            try:
+                result = await analyze_by_address(request, ibex)
+            except HTTPException as e:
+                # One bad address shouldn't fail the rest of the batch
+                return BatchAnalysisResult(address_query=request.address_query, error=str(e.detail))
+        return BatchAnalysisResult(address_query=request.address_query, result=result)
+
+    if "application/x-ndjson" in http_request.headers.get("accept", ""):
+        # Clients that opt in get one JSON line per address as soon as it (and those before it) finish
+        async def stream_results():
+            tasks = [asyncio.ensure_future(analyze_one(request)) for request in requests]
+            try:
+                for task in tasks:
+                    item = await task
+                    yield orjson.dumps(item.model_dump(exclude_none=True)) + b"\n"
+            finally:
+                # Client went away mid-stream: don't keep analysing for nobody
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+    # Results keep request order
+    return await asyncio.gather(*(analyze_one(request) for request in requests))
 
 
 if __name__ == "__main__":
     import uvicorn
-    print("\n" + "="*70)
-    print("   PROPTECH ROI ANALYSIS API")
-    print("="*70)
-    print("\n🏠 POST /api/property/analyze-by-address")
-    print("👀 Docs: http://localhost:8000/docs\n")
-    print("="*70 + "\n")
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
\ No newline at end of file
+    logger.info("Proptech ROI Analysis API: POST /api/property/analyze-by-address, docs at http://localhost:8000/docs")
+    # uvicorn[standard] brings uvloop and httptools, which "auto" picks wherever they're available
+    # (uvloop has no Windows build). Workers need the app as an import string; each gets its own
+    # event loop, connection pools and in-memory caches, sharing only the SQLite cache store, so
+    # there is a single worker unless WEB_CONCURRENCY asks for more
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="auto",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        log_level="info"
+    )
\ No newline at end of file
@@ -1,13 +1,14 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 
-class PropertyAnalysisRequest(BaseModel):
-    address: str = Field(description="Full address or postcode")
-    property_reference: Optional[str] = Field(default=None, description="UPRN or property reference")
-    budget: float = Field(description="Budget in GBP")
-    desired_improvements: List[str] = Field(description="solar, insulation, windows, heat_pump")
-    latitude: Optional[float] = None
-    longitude: Optional[float] = None
+__all__ = [
+    "EnergyCompliance",
+    "RetrofitExample",
+    "ImprovementAnalysis",
+    "PropertyAnalysisResponse",
+    "AddressAnalysisRequest",
+    "BatchAnalysisResult",
+]
 
 class EnergyCompliance(BaseModel):
     current_energy_rating: str
@@ -58,4 +59,9 @@ class PropertyAnalysisResponse(BaseModel):
 class AddressAnalysisRequest(BaseModel):
     address_query: str
     budget: float
-    desired_improvements: List[str]
\ No newline at end of file
+    desired_improvements: List[str] = Field(min_length=1)
+
+class BatchAnalysisResult(BaseModel):
+    address_query: str
+    result: Optional[PropertyAnalysisResponse] = None
+    error: Optional[str] = None
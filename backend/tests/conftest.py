@@ -0,0 +1,9 @@
+import os
+import sys
+
+# main builds its EPC client at import time; a developer's .env mustn't turn on cache persistence
+os.environ.setdefault("EPC_EMAIL", "test@example.com")
+os.environ.setdefault("EPC_API_KEY", "test")
+os.environ["CACHE_DB_PATH"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
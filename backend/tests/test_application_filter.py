@@ -0,0 +1,63 @@
+import copy
+import random
+import re
+
+import pytest
+
+from helpers.application_filter import IMPROVEMENT_KEYWORDS, classify_applications, filter_by_improvement_type
+
+fuzz = pytest.importorskip("thefuzz.fuzz")
+
+WORDS = (
+    "erection of single storey rear extension loft conversion with dormer installation solar panals roof "
+    "replacement windows double glazng heat pumpp air sorce ev chargr battery storage render external wall cladding"
+).split()
+IMPROVEMENT_TYPES = list(IMPROVEMENT_KEYWORDS) + ["Solar", "garage"]
+
+
+def _old_filter(applications, improvement_type, use_fuzzy=True, fuzzy_threshold=85):
+    """The per-type regex and thefuzz filter that classify_applications replaced."""
+    def normalize(text):
+        return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", text.lower())).strip()
+
+    keywords = [normalize(k) for k in IMPROVEMENT_KEYWORDS.get(improvement_type.lower(), [improvement_type.lower()])]
+    matches = []
+    for app in applications:
+        proposal = normalize(app.get("proposal", ""))
+        if any(k in proposal for k in keywords):
+            matches.append(app)
+        elif use_fuzzy and any(fuzz.partial_ratio(k, proposal) >= fuzzy_threshold for k in keywords):
+            matches.append(app)
+    return matches
+
+
+@pytest.fixture(scope="module")
+def applications():
+    rng = random.Random(1)
+    apps = [{"id": i, "proposal": " ".join(rng.choices(WORDS, k=rng.randint(0, 12)))} for i in range(1000)]
+    apps.append({"id": "no-proposal"})
+    return apps
+
+
+@pytest.mark.parametrize("use_fuzzy", [True, False])
+def test_classify_matches_old_filter(applications, use_fuzzy):
+    buckets = classify_applications(applications, IMPROVEMENT_TYPES, use_fuzzy=use_fuzzy)
+
+    for improvement_type in IMPROVEMENT_TYPES:
+        expected = _old_filter(applications, improvement_type, use_fuzzy)
+        assert buckets[improvement_type] == expected, improvement_type
+        assert filter_by_improvement_type(applications, improvement_type, use_fuzzy) == expected, improvement_type
+
+
+def test_null_proposal_matches_nothing():
+    buckets = classify_applications([{"id": 1, "proposal": None}], IMPROVEMENT_TYPES)
+
+    assert all(matches == [] for matches in buckets.values())
+
+
+def test_classification_leaves_applications_untouched(applications):
+    before = copy.deepcopy(applications)
+
+    classify_applications(applications, IMPROVEMENT_TYPES)
+
+    assert applications == before
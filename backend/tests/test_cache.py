@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from helpers import cache
+from helpers.cache import MISS, SQLiteStore, TTLCache, single_flight
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(monkeypatch):
+    monkeypatch.setattr(cache, "_named_caches", {})
+    monkeypatch.setattr(cache, "_store", None)
+
+
+def test_entries_expire_after_ttl(clock):
+    c = TTLCache(maxsize=10, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2, ttl=5)
+
+    clock[0] += 10
+    assert c.get("a") == 1
+    assert c.get("b") is None
+    assert c.get("b", "default") == "default"
+
+    clock[0] += 60
+    assert c.get("a") is None
+    assert len(c) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+
+    assert c.get("a") == 1
+    assert c.get("b") is None
+    assert c.get("c") == 3
+
+
+def test_store_round_trips_named_caches(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    c = TTLCache(maxsize=10, ttl=60, name="things")
+
+    cache.attach_store(path)
+    c.set("a", {"value": [1, 2]})
+    c.set("missing", MISS)
+    c.set("unencodable", object())
+    cache.detach_store()
+
+    c.clear()
+    cache.attach_store(path)
+    try:
+        assert c.get("a") == {"value": [1, 2]}
+        assert c.get("missing") is None
+        assert c.get("unencodable") is None
+    finally:
+        cache.detach_store()
+
+
+def test_store_drops_expired_rows_on_load(tmp_path):
+    c = TTLCache(maxsize=10, ttl=60, name="things")
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"))
+    try:
+        store.put("things", "old", 1, expires_at=0.0)
+        store.put("things", "new", 2, expires_at=cache.time.time() + 60)
+        store.flush()
+
+        assert store.load(c) == 1
+        assert c.get("old") is None
+        assert c.get("new") == 2
+    finally:
+        store.close()
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    calls = []
+
+    @single_flight(lambda key: key)
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    async def run():
+        results = await asyncio.gather(fetch("a"), fetch("a"), fetch("b"), fetch("a"))
+        # The in-flight entry is gone once the call finishes, so a later call fetches again
+        return results, await fetch("a")
+
+    results, again = asyncio.run(run())
+
+    assert results == ["A", "A", "B", "A"]
+    assert again == "A"
+    assert calls == ["a", "b", "a"]
+
+
+def test_single_flight_survives_one_caller_being_cancelled():
+    @single_flight(lambda key: key)
+    async def fetch(key):
+        await asyncio.sleep(0.01)
+        return key
+
+    async def run():
+        first = asyncio.ensure_future(fetch("a"))
+        second = asyncio.ensure_future(fetch("a"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(run()) == ("a", True)
+
+
+def test_single_flight_cancels_call_once_every_caller_has_gone():
+    started, cancelled = [], []
+
+    @single_flight(lambda key: key)
+    async def fetch(key):
+        started.append(key)
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.append(key)
+            raise
+
+    async def run():
+        callers = [asyncio.ensure_future(fetch("a")) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        # A new caller starts its own call instead of joining the cancelled one
+        later = asyncio.ensure_future(fetch("a"))
+        await asyncio.sleep(0)
+        later.cancel()
+        await asyncio.gather(later, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    assert started == ["a", "a"]
+    assert cancelled == ["a", "a"]
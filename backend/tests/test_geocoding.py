@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+import httpx
+
+from helpers import geocoding
+
+
+def test_requests_are_spaced_and_repeats_served_from_cache(monkeypatch):
+    started = []
+
+    class FakeClient:
+        async def get(self, url, params=None):
+            started.append((params["q"], time.monotonic()))
+            return httpx.Response(200, json=[{"lat": "51.5", "lon": "-0.1", "display_name": params["q"]}])
+
+    monkeypatch.setattr(geocoding, "NOMINATIM_MIN_INTERVAL", 0.05)
+    monkeypatch.setattr(geocoding, "_rate_lock", asyncio.Lock())
+    monkeypatch.setattr(geocoding, "_last_request_at", 0.0)
+    monkeypatch.setattr(geocoding, "_http", FakeClient)
+    geocoding._geocode_cache.clear()
+
+    async def run():
+        queries = ["1 A St", "2 B St", "3 C St", "1 a  st"]
+        return await asyncio.gather(*(geocoding.geocode_address(q) for q in queries))
+
+    results = asyncio.run(run())
+    geocoding._geocode_cache.clear()
+
+    assert [r["display_name"] for r in results] == ["1 A St", "2 B St", "3 C St", "1 A St"]
+    assert [q for q, _ in started] == ["1 A St", "2 B St", "3 C St"]
+    gaps = [b - a for (_, a), (_, b) in zip(started, started[1:])]
+    assert all(gap >= 0.045 for gap in gaps)
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+
+import httpx
+import orjson
+
+import ibex_client
+from ibex_client import IBexClient, MAX_PAGES, PAGE_SIZE
+
+
+def _client_serving(page_sizes):
+    """IBexClient whose /search returns page_sizes[page - 1] applications per page."""
+    requested = []
+
+    def handler(request):
+        page = orjson.loads(request.content)["input"]["page"]
+        requested.append(page)
+        size = page_sizes[page - 1] if page <= len(page_sizes) else 0
+        return httpx.Response(200, json=[{"planning_reference": f"{page}-{i}"} for i in range(size)])
+
+    client = IBexClient("key", "http://ibex.test")
+    client._http = httpx.AsyncClient(base_url="http://ibex.test", transport=httpx.MockTransport(handler))
+    return client, requested
+
+
+def _search(client):
+    async def run():
+        try:
+            return await client.search_by_location(51.5, -0.1)
+        finally:
+            await client.shutdown()
+    return asyncio.run(run())
+
+
+def test_short_first_page_is_the_only_request():
+    client, requested = _client_serving([3])
+
+    assert len(_search(client)) == 3
+    assert requested == [1]
+
+
+def test_pages_stop_at_first_short_page():
+    client, requested = _client_serving([PAGE_SIZE, PAGE_SIZE, 10, PAGE_SIZE])
+
+    data = _search(client)
+
+    assert requested == [1, 2, 3]
+    assert len(data) == 2 * PAGE_SIZE + 10
+    assert data[-1]["planning_reference"] == "3-9"
+
+
+def test_page_cap_is_logged(caplog):
+    client, requested = _client_serving([PAGE_SIZE] * (MAX_PAGES + 2))
+
+    with caplog.at_level(logging.WARNING, logger=ibex_client.__name__):
+        data = _search(client)
+
+    assert requested == list(range(1, MAX_PAGES + 1))
+    assert len(data) == MAX_PAGES * PAGE_SIZE
+    assert "page cap" in caplog.text
@@ -0,0 +1,159 @@
+import asyncio
+import gc
+import logging
+
+import httpx
+import orjson
+from fastapi.testclient import TestClient
+
+import main
+from helpers import geocoding
+
+ANALYZE_PATH = "/api/property/analyze-by-address"
+REQUEST_BODY = {
+    "address_query": "1 Test St, London N1 1AA",
+    "budget": 30000,
+    "desired_improvements": ["solar"],
+}
+
+
+BATCH_PATH = "/api/property/analyze-batch"
+
+EPC_ROW = {
+    "address1": "1 Test St", "address": "1 Test St, London", "current-energy-rating": "D",
+    "lmk-key": "x1", "total-floor-area": "80",
+}
+APPLICATION = {
+    "planning_reference": "REF1", "proposal": "Installation of solar panels", "normalised_decision": "Approved",
+    "application_date": "2023-01-01T00:00:00Z", "decided_date": "2023-03-01T00:00:00Z",
+}
+
+
+def _fake_upstream(request: httpx.Request) -> httpx.Response:
+    host = request.url.host
+    if "nominatim" in host:
+        if "Nowhere" in request.url.params["q"]:
+            return httpx.Response(200, json=[])
+        return httpx.Response(200, json=[{"lat": "51.5", "lon": "-0.1", "display_name": request.url.params["q"]}])
+    if "ibex" in host:
+        return httpx.Response(200, json=[APPLICATION])
+    if "epc" in host and "recommendations" in request.url.path:
+        return httpx.Response(200, json={"rows": []})
+    if "epc" in host:
+        return httpx.Response(200, json={"rows": [EPC_ROW]})
+    if "landregistry" in host:
+        return httpx.Response(200, json={"results": {"bindings": []}})
+    if "planning.data" in host:
+        return httpx.Response(200, json={"entities": []})
+    return httpx.Response(404)
+
+
+async def _fake_send(self, request, **kwargs):
+    response = _fake_upstream(request)
+    response.request = request
+    return response
+
+
+async def _not_found(query):
+    # Yield long enough for lookups started alongside geocoding to get going
+    await asyncio.sleep(0.01)
+    return None
+
+
+class _SlowLookups:
+    """Stand-in for the EPC and value lookups that records whether they ran and were cancelled."""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.started += 1
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+def _patch_lookups(monkeypatch):
+    lookups = _SlowLookups()
+    monkeypatch.setattr(main.geocoding, "geocode_address", _not_found)
+    monkeypatch.setattr(main.epc_client, "get_property_metrics", lookups)
+    monkeypatch.setattr(main.value_calculator, "fetch_property_context", lookups)
+    return lookups
+
+
+def test_unknown_address_is_404_and_cancels_lookups(monkeypatch, caplog):
+    lookups = _patch_lookups(monkeypatch)
+
+    with caplog.at_level(logging.ERROR, logger="asyncio"), TestClient(main.app) as client:
+        response = client.post(ANALYZE_PATH, json=REQUEST_BODY)
+        gc.collect()
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Address not found."}
+    assert lookups.started == lookups.cancelled == 2
+    assert not [r for r in caplog.records if r.name == "asyncio"]
+
+
+def test_lookups_wait_for_geocoding_without_a_postcode(monkeypatch):
+    lookups = _patch_lookups(monkeypatch)
+
+    with TestClient(main.app) as client:
+        response = client.post(ANALYZE_PATH, json={**REQUEST_BODY, "address_query": "1 Test St, London"})
+
+    assert response.status_code == 404
+    assert lookups.started == 0
+
+
+def test_config_returns_prebuilt_body():
+    with TestClient(main.app) as client:
+        response = client.get("/api/config")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == {"mapboxToken": main.MAPBOX_TOKEN}
+
+
+def test_empty_desired_improvements_is_rejected():
+    with TestClient(main.app) as client:
+        response = client.post(ANALYZE_PATH, json={**REQUEST_BODY, "desired_improvements": []})
+
+    assert response.status_code == 422
+
+
+def test_batch_streams_ndjson_in_request_order(monkeypatch):
+    monkeypatch.setattr(httpx.AsyncClient, "send", _fake_send)
+    monkeypatch.setattr(geocoding, "NOMINATIM_MIN_INTERVAL", 0.0)
+    body = [
+        REQUEST_BODY,
+        {**REQUEST_BODY, "address_query": "Nowhere Lane, ZZ1 1ZZ"},
+        {**REQUEST_BODY, "address_query": "1 Test St, London N1 1AB"},
+    ]
+
+    with TestClient(main.app) as client:
+        response = client.post(BATCH_PATH, json=body, headers={"Accept": "application/x-ndjson"})
+        plain = client.post(BATCH_PATH, json=body)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [orjson.loads(line) for line in response.content.splitlines()]
+    assert [line["address_query"] for line in lines] == [item["address_query"] for item in body]
+    assert lines[1] == {"address_query": "Nowhere Lane, ZZ1 1ZZ", "error": "Address not found."}
+    assert [imp["improvement_type"] for imp in lines[0]["result"]["improvements"]] == ["solar"]
+    assert lines == plain.json()
+
+
+def test_app_can_start_again_after_shutdown():
+    with TestClient(main.app):
+        pass
+
+    with TestClient(main.app):
+        clients = [
+            main.epc_client.http,
+            main.geocoding._http(),
+            main.feasibility_calculator._http(),
+            main.value_calculator._http(),
+        ]
+        assert not any(client.is_closed for client in clients)